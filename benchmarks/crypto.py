@@ -0,0 +1,45 @@
+# Micro-benchmark of encrypted Giiker packet decryption.
+#
+# Run from the repository root with: python3 -m benchmarks.crypto
+
+import random
+import timeit
+
+from bluetoothcube.btutil.const import GIIKER_KEY
+from bluetoothcube.btutil.crypto import decrypt_packet, encrypt_packet
+
+N = 100000
+
+
+# The previous implementation, for comparison.
+def decrypt_hex(value):
+    bla = ""
+    k = value[19]
+    k1 = k >> 4 & 0xf
+    k2 = k & 0xf
+    for i in range(0, len(value) - 2):
+        move = (value[i] + GIIKER_KEY[i + k1] + GIIKER_KEY[i + k2]) & 0xff
+        bla += "{0:02x}".format(move)
+    return bytes.fromhex(bla)
+
+
+def main():
+    random.seed(0)
+    packets = [encrypt_packet(bytes(random.randrange(256) for _ in range(20)),
+                              random.randrange(256))
+               for _ in range(256)]
+    for packet in packets:
+        assert decrypt_packet(packet) == decrypt_hex(packet)
+
+    for name, decrypt in [("hex strings", decrypt_hex),
+                          ("offset tables", decrypt_packet)]:
+        t = min(timeit.repeat(
+            lambda: [decrypt(p) for p in packets], number=N // 256,
+            repeat=5))
+        n = N // 256 * 256
+        print(f"{name:<16} {t / n * 1e6:8.2f} us/packet  "
+              f"{n / t / 1000:8.0f} kpackets/s")
+
+
+if __name__ == '__main__':
+    main()
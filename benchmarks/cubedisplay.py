@@ -0,0 +1,57 @@
+# Benchmark of the cube displays: updating the canvas per move and per resize,
+# and drawing the canvas into an offscreen buffer. Drawing is measured on the
+# CPU side, it does not wait for the GPU to finish.
+#
+# Run from the repository root with: python3 -m benchmarks.cubedisplay
+
+import random
+import timeit
+import itertools
+
+from kivy.app import App
+from kivy.graphics import Fbo
+
+from bluetoothcube.bluetoothcube import BluetoothCube
+from bluetoothcube.cubedisplay import CubeDisplay, CubeMeshDisplay
+from bluetoothcube.cubestate import CubieCube
+
+N = 1000
+
+
+def main():
+    # CubeDisplay binds to the running app's cube.
+    app = App()
+    app.cube = BluetoothCube()
+
+    states = []
+    state = CubieCube()
+    for _ in range(N):
+        state.apply_move(random.randrange(18))
+        states.append(CubieCube(
+            cp=state.cp, co=state.co, ep=state.ep, eo=state.eo))
+    states = itertools.cycle(states)
+
+    for cls in [CubeDisplay, CubeMeshDisplay]:
+        display = cls(size=(400, 300))
+
+        def move():
+            display.on_cube_state_changed(app.cube, next(states))
+
+        def resize():
+            display.size = (display.width + 1, display.height)
+
+        fbo = Fbo(size=(400, 300))
+        fbo.add(display.canvas)
+
+        def draw():
+            move()
+            fbo.draw()
+
+        for name, stmt in [("move", move), ("resize", resize),
+                           ("move+draw", draw)]:
+            t = min(timeit.repeat(stmt, number=N, repeat=5))
+            print(f"{cls.__name__:<16} {name:<10} {t / N * 1e6:8.1f} us")
+
+
+if __name__ == '__main__':
+    main()
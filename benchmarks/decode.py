@@ -0,0 +1,26 @@
+# Micro-benchmark of Giiker state packet decoding.
+#
+# Run from the repository root with: python3 -m benchmarks.decode
+
+import timeit
+
+from bluetoothcube.cubestate import CubieCube, decode_giiker_state
+
+# The solved state. Decoding cost does not depend on the cube state.
+PACKET = bytes.fromhex("123456783333333312345678" "9abc0000" "11000000")
+
+N = 100000
+
+
+def main():
+    for name, stmt in [
+            ("decode_giiker_state", lambda: decode_giiker_state(PACKET)),
+            ("CubieCube(giiker_state)",
+             lambda: CubieCube(giiker_state=PACKET)),
+    ]:
+        t = min(timeit.repeat(stmt, number=N, repeat=5))
+        print(f"{name:<28} {t / N * 1e6:8.2f} us/packet")
+
+
+if __name__ == '__main__':
+    main()
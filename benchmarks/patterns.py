@@ -0,0 +1,59 @@
+# Benchmark of matching a cube state against all CFOP stage patterns.
+#
+# Run from the repository root with: python3 -m benchmarks.patterns
+
+import timeit
+
+from bluetoothcube.cubestate import CubieCube
+from bluetoothcube.patterns import CFOP_CROSS, CFOP_F2L, CFOP_OLL, CFOP_PLL
+
+N = 20000
+
+
+def scrambled_cube():
+    # Random-ish moves, no stage is complete so every variant gets checked.
+    cube = CubieCube()
+    for move in [0, 4, 7, 11, 14, 15, 2, 9, 5, 12]:
+        cube.apply_move(move)
+    return cube
+
+
+def main():
+    cube = scrambled_cube()
+    facecube = cube.toFaceCube()
+    stages = [CFOP_CROSS, CFOP_F2L, CFOP_OLL, CFOP_PLL]
+
+    def loop():
+        for patterns in stages:
+            for pattern in patterns:
+                if facecube.matches(pattern):
+                    break
+
+    def masks():
+        for patterns in stages:
+            facecube.matches_any(patterns)
+
+    def cubie_masks():
+        # As the analyzer does it. The one-hot state is recomputed on every
+        # run.
+        cube.state_changed()
+        for patterns in stages:
+            cube.matches_any(patterns)
+
+    def facelet_masks():
+        # As the analyzer used to do it, with a facelet conversion per check.
+        # Facelets are cached per state, so the state is marked as changed.
+        for patterns in stages:
+            cube.state_changed()
+            cube.toFaceCube().matches_any(patterns)
+
+    for name, stmt in [("FaceCube.matches loop", loop),
+                       ("PatternSet bitmasks", masks),
+                       ("toFaceCube + bitmasks", facelet_masks),
+                       ("CubieCube masks", cubie_masks)]:
+        t = min(timeit.repeat(stmt, number=N, repeat=5))
+        print(f"{name:<28} {t / N * 1e6:8.2f} us/state")
+
+
+if __name__ == '__main__':
+    main()
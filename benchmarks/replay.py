@@ -0,0 +1,52 @@
+# Benchmark of the whole packet processing pipeline (cube state, timer,
+# analyzer, time history), fed from a packet capture as fast as possible.
+#
+# Capture packets by running the app with: python3 -m main -- --capture
+# Then run from the repository root with:
+#     python3 -m benchmarks.replay path/to/capture.bcpk
+
+import sys
+import time
+
+# Normally imported by the app before any of its modules.
+import kivy.event  # noqa: F401
+import kivy.properties  # noqa: F401
+
+from bluetoothcube.bluetoothcube import BluetoothCube
+from bluetoothcube.btutil.capture import ReplayConnection
+from bluetoothcube.solveanalyzers import Analyzer
+from bluetoothcube.timehistory import TimeHistory
+from bluetoothcube.timer import Timer
+
+
+def main():
+    if len(sys.argv) != 2:
+        print("Usage: python3 -m benchmarks.replay capture.bcpk")
+        sys.exit(1)
+
+    connection = ReplayConnection(sys.argv[1], realtime=False)
+    cube = BluetoothCube()
+    timer = Timer(cube)
+    analyzer = Analyzer(cube, timer)
+    timer.use_analyzer(analyzer)
+    timehistory = TimeHistory()
+    timer.bind(on_new_time=lambda t, time: timehistory.add_time(time))
+
+    # Scramble detection relies on the clock, which does not run here.
+    # Instead, start timing the next solve whenever the cube gets solved.
+    cube.bind(solved=lambda c, solved: solved and timer.prime())
+
+    connection.bind(on_cube_connected=lambda c: cube.set_connection(c))
+    connection.connect()
+    start = time.perf_counter()
+    connection.replay_all()
+    elapsed = time.perf_counter() - start
+
+    n = len(connection.packets)
+    print(f"Replayed {n} packets in {elapsed * 1000:.1f} ms, "
+          f"{elapsed / max(n, 1) * 1e6:.1f} us/packet, "
+          f"{len(timehistory.data)} solves recorded.")
+
+
+if __name__ == '__main__':
+    main()
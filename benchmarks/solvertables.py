@@ -0,0 +1,55 @@
+# Benchmark of loading the pure-Python Kociemba solver tables at startup:
+# unpickling the original tables vs. memory-mapping the binary table file.
+#
+# Run from the repository root with: python3 -m benchmarks.solvertables
+
+import os
+import sys
+import tempfile
+import subprocess
+
+# Measured in a fresh interpreter, so that nothing is cached. The search is
+# run directly, as kociemba.solve() would use the native solver instead, when
+# it is installed.
+STARTUP = """
+import time
+start = time.perf_counter()
+{setup}
+from kociemba.pykociemba.coordcube import CoordCube
+from kociemba.pykociemba.search import Search
+CoordCube.twistMove
+loaded = time.perf_counter()
+Search().solution(
+    "DRLUUBFBRBLURRLRUBLRDDFDLFUFUFFDBRDUBRUFLLFDDBFLUBLRBD", 24, 1000, False)
+solved = time.perf_counter()
+print(f"{{(loaded - start) * 1000:8.1f}} ms "
+      f"{{(solved - start) * 1000:8.1f}} ms")
+"""
+
+MAPPED_SETUP = """
+from bluetoothcube import kociembatables
+kociembatables.install()
+kociembatables.use_directory({directory!r})
+"""
+
+
+def run(setup):
+    return subprocess.run(
+        [sys.executable, '-W', 'ignore', '-c', STARTUP.format(setup=setup)],
+        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+        universal_newlines=True, check=True).stdout.strip().splitlines()[-1]
+
+
+def main():
+    print(f"{'':<24} {'tables':>11} {'first solve':>11}")
+    print(f"{'original tables':<24} {run('')}")
+    with tempfile.TemporaryDirectory() as directory:
+        setup = MAPPED_SETUP.format(directory=directory)
+        print(f"{'generate binary file':<24} {run(setup)}")
+        print(f"{'memory-mapped':<24} {run(setup)}")
+        size = os.path.getsize(os.path.join(directory, 'kociemba-tables.bin'))
+        print(f"Table file size: {size / 2**20:.1f} MiB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+# Benchmark of loading a long time history from times.txt (and from the
+# binary format of historystore) and computing personal bests over it.
+#
+# Run from the repository root with: python3 -m benchmarks.timehistory
+
+import os
+import time
+import random
+import datetime
+import tempfile
+
+# Normally imported by the app before any of its modules.
+import kivy.event  # noqa: F401
+import kivy.properties  # noqa: F401
+
+from bluetoothcube.common import Time
+from bluetoothcube.historystore import HistoryColumns
+from bluetoothcube.timehistory import TimeHistory
+
+N = 100000
+
+
+def generate_history(filepath):
+    random.seed(0)
+    ts = datetime.datetime(2019, 1, 1)
+    with open(filepath, 'w') as f:
+        for i in range(N):
+            ts += datetime.timedelta(seconds=random.randint(30, 600))
+            t = Time(round(random.uniform(10, 40), 2), {'stage_times': [
+                ['CROSS', 2.5], ['F2L', 10.1], ['OLL', 3.4], ['PLL', 3.2]]})
+            t.ts = ts
+            f.write(t.save() + "\n")
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        filepath = os.path.join(directory, "times.txt")
+        generate_history(filepath)
+
+        th = TimeHistory()
+        start = time.perf_counter()
+        th.use_file(filepath)
+        loaded = time.perf_counter()
+        # What loading used to cost: every timestamp and metadata parsed.
+        for t in th.data:
+            t.ts, t.meta
+        parsed = time.perf_counter()
+        th.get_best_aon(1000)
+        best = time.perf_counter()
+        th.add_time(Time(12.34))
+        added = time.perf_counter()
+        stats = th.get_stage_stats()
+        stats_built = time.perf_counter()
+        f2l = stats['F2L']
+        f2l.mean(), f2l.percentile(90), f2l.trend(1000), f2l.rolling_means(100)
+        queried = time.perf_counter()
+
+        binary_path = os.path.join(directory, "times.bin")
+        HistoryColumns.from_times(th.data).save(binary_path)
+        th = TimeHistory()
+        th.binary = True
+        binary_start = time.perf_counter()
+        th.load_file(binary_path)
+        binary_loaded = time.perf_counter()
+        th = TimeHistory()
+        text_start = time.perf_counter()
+        th.load_file(filepath)
+        text_loaded = time.perf_counter()
+
+        print(f"Loading {N} solves:       {(loaded - start) * 1000:8.1f} ms")
+        print(f"Parsing all metadata:     {(parsed - loaded) * 1000:8.1f} ms")
+        print(f"Best Ao1000 (new N):      {(best - parsed) * 1000:8.1f} ms")
+        print(f"Adding a solve:           {(added - best) * 1000:8.1f} ms")
+        print(f"Building stage stats:     "
+              f"{(stats_built - added) * 1000:8.1f} ms")
+        print(f"Querying F2L stats:       "
+              f"{(queried - stats_built) * 1000:8.1f} ms")
+        print(f"Reading times.txt only:   "
+              f"{(text_loaded - text_start) * 1000:8.1f} ms")
+        print(f"Reading times.bin only:   "
+              f"{(binary_loaded - binary_start) * 1000:8.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
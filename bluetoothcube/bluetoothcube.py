@@ -3,9 +3,15 @@ import kivy
 from kivy.clock import Clock
 from kociemba.pykociemba.color import color_keys
 
-from bluetoothcube.cubestate import CubieCube, MOVES_GIIKER_TO_KOCIEMBA
+from bluetoothcube import latency
+from bluetoothcube.cubestate import (
+    CubieCube, MOVES_GIIKER_TO_KOCIEMBA, SOLVED_GIIKER_STATE,
+    giiker_move_to_kociemba)
+from bluetoothcube.movelog import MoveRing, MoveLogWriter
 
-from typing import List
+from typing import List, Optional
+
+FACE_INDEX = {face: i for i, face in enumerate(color_keys)}
 
 
 class Move:
@@ -36,6 +42,18 @@ class Move:
     def is_printable(self):
         return self.count % 4 != 0
 
+    # Encodes the move in a single byte, for move logs: the face in bits 5-7,
+    # the direction in bit 4 and the count in bits 0-3. The count is stored
+    # modulo 16, which keeps count % 4.
+    def code(self) -> int:
+        return (FACE_INDEX[self.face] << 5 |
+                (self.dir == "'") << 4 | self.count % 16)
+
+    @staticmethod
+    def from_code(code: int) -> 'Move':
+        return Move(color_keys[code >> 5], "'" if code & 0x10 else "",
+                    code & 0x0F)
+
     @staticmethod
     def list_to_str(list: List['Move']):
         return ' '.join(str(m) for m in list if m.is_printable())
@@ -56,65 +74,165 @@ def merge_moves(a: Move, b: Move) -> List[Move]:
 class BluetoothCube(kivy.event.EventDispatcher):
     solved = kivy.properties.BooleanProperty(False)
 
+    # When enabled, the cube state is kept up to date by applying each
+    # reported move to the current state, instead of decoding the entire state
+    # packet. The full state is still decoded every VERIFY_INTERVAL moves, and
+    # whenever either the tracked or the reported state becomes solved, to
+    # catch missed notifications.
+    incremental = kivy.properties.BooleanProperty(False)
+    VERIFY_INTERVAL = 10
+
+    # Number of moves remembered in memory. Older raw moves are only kept in
+    # the move log on disk, if enabled with use_move_log().
+    RAW_HISTORY = 1000
+    MERGED_HISTORY = 50
+
+    # on_state_changed is dispatched for every state update, for listeners
+    # that must see each state (timer, analyzer). on_latest_state is
+    # dispatched at most once per frame, with the newest state, for costly
+    # work that only needs to show the current state (rendering, etc.). A
+    # burst of moves that arrives within one frame then only causes one
+    # redraw.
     def __init__(self):
         self.register_event_type('on_state_changed')
+        self.register_event_type('on_latest_state')
+        self.register_event_type('on_state_desync')
         self.register_event_type('on_move_raw')
         self.register_event_type('on_move_merged')
         super(BluetoothCube, self).__init__()
         self.cube_state = CubieCube()
-        self.move_history_raw: List[Move] = []
-        self.move_history_merged: List[Move] = []
+        self.move_history_raw = MoveRing(self.RAW_HISTORY)
+        self.move_history_merged = MoveRing(self.MERGED_HISTORY)
+        self.move_log: Optional[MoveLogWriter] = None
         self.connection = None
+        # None means that the state is not known and needs a full decode.
+        self.moves_since_verify = None
+        # Arrival time (from time.perf_counter_ns()) of the last state
+        # update, None without a connection.
+        self.last_update_ts = None
+        self.latest_state_trigger = Clock.create_trigger(
+            lambda td: self.dispatch('on_latest_state', self.cube_state))
+
+    # Streams all raw moves to a rotating log in the given directory.
+    def use_move_log(self, directory):
+        self.move_log = MoveLogWriter(directory)
+
+    def flush_move_log(self):
+        if self.move_log:
+            try:
+                self.move_log.flush()
+            except OSError as e:
+                self.disable_move_log(e)
+
+    def disable_move_log(self, error: OSError):
+        print(f"Failed to write move log, disabling it: {str(error)}")
+        self.close_move_log()
+
+    def close_move_log(self):
+        if self.move_log:
+            self.move_log.close()
+            self.move_log = None
+
+    # Last n moves (all remembered moves if n is None), oldest first.
+    def get_raw_moves(self, n: Optional[int] = None) -> List[Move]:
+        return [Move.from_code(code)
+                for code, _ in self.move_history_raw.last(n)]
+
+    def get_merged_moves(self, n: Optional[int] = None) -> List[Move]:
+        return [Move.from_code(code)
+                for code, _ in self.move_history_merged.last(n)]
 
     def set_connection(self, connection):
         self.connection = connection
         self.cube_state = CubieCube()
+        self.moves_since_verify = None
         self.connection.bind(on_state_updated=self.process_state_update)
 
     def disable_connection(self):
         self.cube_state = CubieCube()
+        self.moves_since_verify = None
         self.connection = None
+        self.last_update_ts = None
         self.solved = self.cube_state.is_solved()
         self.dispatch('on_state_changed', self.cube_state)
-
-    def process_state_update(self, connection, state):
-        self.cube_state = CubieCube(giiker_state=state)
+        self.latest_state_trigger()
+
+    def process_state_update(self, connection, state, ts):
+        self.last_update_ts = ts
+        if self.incremental and self.moves_since_verify is not None:
+            self.cube_state.apply_move(giiker_move_to_kociemba(state[16]))
+            self.moves_since_verify += 1
+            # The reported state is checked too, otherwise a missed move
+            # would keep the tracked state unsolved when the cube is solved.
+            if (self.moves_since_verify >= self.VERIFY_INTERVAL or
+                    self.cube_state.is_solved() or
+                    bytes(state[:16]) == SOLVED_GIIKER_STATE):
+                self.verify_state(state)
+        else:
+            self.cube_state = CubieCube(giiker_state=state)
+            self.moves_since_verify = 0
         self.solved = self.cube_state.is_solved()
 
         face = color_keys[MOVES_GIIKER_TO_KOCIEMBA[(state[16] >> 4) & 0x0F]]
         dir = ("" if (state[16] & 0x0F) == 1 else "'")
         move = Move(face, dir)
-        self.move_history_raw.append(move)
+        code = move.code()
+        delta = self.move_history_raw.append(code, ts)
+        if self.move_log:
+            try:
+                self.move_log.write(code, delta)
+            except OSError as e:
+                self.disable_move_log(e)
 
         # s = '  '.join(self.cube_state.get_representation_strings())
         # print(f"{s}  {move}")
 
+        latency.tracker.mark(latency.DECODE)
         self.dispatch('on_state_changed', self.cube_state)
+        self.latest_state_trigger()
         self.dispatch('on_move_raw', move)
 
-        self.add_move_to_rich_history(move)
-
-    def add_move_to_rich_history(self, move: Move):
+        self.add_move_to_rich_history(move, ts)
+        latency.tracker.processed()
+
+    # Compares the incrementally tracked state with the full state reported by
+    # the cube. A mismatch means that some notifications were lost or arrived
+    # out of order.
+    def verify_state(self, state):
+        reported_state = CubieCube(giiker_state=state)
+        self.moves_since_verify = 0
+        if reported_state != self.cube_state:
+            print("Cube state out of sync, some moves were not received.")
+            self.cube_state = reported_state
+            self.dispatch('on_state_desync')
+
+    def add_move_to_rich_history(self, move: Move, ts: int):
         if len(self.move_history_merged) < 1:
-            self.move_history_merged.append(move)
+            self.move_history_merged.append(move.code(), ts)
             return
 
         # Merge last two moves, if applicable
-        last_move = self.move_history_merged[-1]
-        self.move_history_merged.pop()
+        last_move = Move.from_code(self.move_history_merged[-1])
         new_moves = merge_moves(last_move, move)
-        self.move_history_merged += new_moves
+        if len(new_moves) == 1:
+            self.move_history_merged.replace_last(new_moves[0].code())
+        else:
+            # The ring buffer only keeps the last MERGED_HISTORY moves.
+            self.move_history_merged.append(move.code(), ts)
 
-        # Trim the moves list to last 50 moves.
-        self.move_history_merged = self.move_history_merged[-50:]
-
-        # print(Move.list_to_str(self.move_history_merged))
+        # print(Move.list_to_str(self.get_merged_moves()))
 
         self.dispatch('on_move_merged', new_moves[-1])
 
     def on_state_changed(self, *args):
         pass
 
+    def on_latest_state(self, *args):
+        pass
+
+    def on_state_desync(self, *args):
+        pass
+
     def on_move_raw(self, *args):
         pass
 
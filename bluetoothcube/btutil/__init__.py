@@ -1,11 +1,19 @@
 from kivy.utils import platform
 
-if platform == 'android':
-    from bluetoothcube.btutil.android import (  # noqa: F401
-        BluetoothCubeScanner, BluetoothCubeConnection)
-elif platform == 'linux':
-    from bluetoothcube.btutil.linux import (  # noqa: F401
-        BluetoothCubeScanner, BluetoothCubeConnection)
 
-else:
-    raise NotImplementedError('Only android and linux platforms are supported')
+# The platform backend is only imported when it is first used, so that the
+# platform independent modules of this package (const, crypto, capture,
+# simulated) also work without a Bluetooth stack, e.g. in benchmarks.
+def __getattr__(name):
+    if name not in ('BluetoothCubeScanner', 'BluetoothCubeConnection'):
+        raise AttributeError(
+            f"module {__name__!r} has no attribute {name!r}")
+
+    if platform == 'android':
+        from bluetoothcube.btutil import android as backend
+    elif platform == 'linux':
+        from bluetoothcube.btutil import linux as backend
+    else:
+        raise NotImplementedError(
+            'Only android and linux platforms are supported')
+    return getattr(backend, name)
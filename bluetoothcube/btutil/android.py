@@ -1,10 +1,13 @@
 import kivy
+import time
 from jnius import autoclass, PythonJavaClass, java_method, cast
 
+from bluetoothcube import latency
 from bluetoothcube.btutil.const import (
     CUBE_STATE_SERVICE, CUBE_STATE_RESPONSE,
     CUBE_INFO_SERVICE, CUBE_INFO_REQUEST, CUBE_INFO_RESPONSE,
     CLIENT_CHARACTERISTIC_UUID, CUBE_INFO_REQUEST_COMMANDS)
+from bluetoothcube.btutil.crypto import decrypt_packet, is_encrypted
 
 GATT_STATE_CONNECTED = 0x02
 GATT_STATE_DISCONNECTED = 0x00
@@ -192,7 +195,13 @@ class BluetoothCubeConnection(kivy.event.EventDispatcher):
 
     def on_gatt_characteristic_changed(self, gatt, characteristic):
         if characteristic.equals(self.state_response_characteristic):
-            self.dispatch('on_state_updated', characteristic.getValue())
+            ts = time.perf_counter_ns()
+            record = latency.tracker.arrived(ts)
+            value = bytes(characteristic.getValue())
+            if is_encrypted(value):
+                value = decrypt_packet(value)
+            latency.tracker.dispatched(record)
+            self.dispatch('on_state_updated', value, ts)
         else:
             print(f"Characteristic {characteristic.getUuid()} changed!")
 
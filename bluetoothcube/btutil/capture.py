@@ -0,0 +1,179 @@
+import time
+import struct
+
+import kivy
+from kivy.clock import Clock
+
+from bluetoothcube import latency
+from bluetoothcube.btutil.const import CUBE_INFO_REQUEST_COMMANDS
+from bluetoothcube.utils import TIMESTAMPED_HEADER, epoch_microseconds
+
+from typing import Iterator, List, Tuple
+
+# Capture and replay of raw cube state packets.
+#
+# A capture file starts with a header, followed by one record per packet: the
+# time since the start of the capture in nanoseconds, the payload length and
+# the payload itself. Replaying a capture feeds the packets through the same
+# events as a real cube connection, so the whole pipeline (cube state, timer,
+# analyzer, time history) can be exercised without a cube.
+
+FILE_MAGIC = b'BCPK'
+FILE_VERSION = 1
+
+# The header (TIMESTAMPED_HEADER) holds the wall-clock time of the start of
+# the capture.
+# Nanoseconds since the start of the capture, payload length.
+RECORD = struct.Struct('<QB')
+
+
+def read_capture(path) -> Iterator[Tuple[int, bytes]]:
+    with open(path, 'rb') as f:
+        data = f.read()
+    magic, version, _ = TIMESTAMPED_HEADER.unpack_from(data)
+    if magic != FILE_MAGIC or version != FILE_VERSION:
+        raise ValueError(f"{path} is not a compatible capture file")
+    offset = TIMESTAMPED_HEADER.size
+    while offset + RECORD.size <= len(data):
+        ts, length = RECORD.unpack_from(data, offset)
+        offset += RECORD.size
+        if offset + length > len(data):
+            break  # Truncated by a crash during capture.
+        yield ts, data[offset:offset + length]
+        offset += length
+
+
+# Writes every state packet received from a connection to a capture file,
+# with its arrival time.
+class PacketRecorder:
+    def __init__(self, connection, path):
+        self.connection = connection
+        self.path = path
+        self.file = open(path, 'wb')
+        self.file.write(TIMESTAMPED_HEADER.pack(
+            FILE_MAGIC, FILE_VERSION, epoch_microseconds()))
+        self.start = time.perf_counter_ns()
+        self.count = 0
+        connection.bind(on_state_updated=self.on_state_updated)
+
+    def on_state_updated(self, connection, state, ts):
+        state = bytes(state)
+        self.file.write(RECORD.pack(max(ts - self.start, 0), len(state)))
+        self.file.write(state)
+        self.count += 1
+
+    def close(self):
+        if not self.file:
+            return
+        self.connection.unbind(on_state_updated=self.on_state_updated)
+        self.file.close()
+        self.file = None
+        print(f"Captured {self.count} packets to {self.path}")
+
+
+# A stand-in for BluetoothCubeConnection that replays a capture file, either
+# with the original timing or as fast as possible. Either way, packets carry
+# arrival times with the original intervals, so recorded solve times are the
+# same as in the capture.
+class ReplayConnection(kivy.event.EventDispatcher):
+    def __init__(self, path, realtime=True):
+        self.register_event_type('on_cube_connecting')
+        self.register_event_type('on_cube_connecting_failed')
+        self.register_event_type('on_cube_connected')
+        self.register_event_type('on_cube_disconnected')
+        self.register_event_type('on_state_updated')
+        self.register_event_type('on_replay_finished')
+        super().__init__()
+        self.path = path
+        self.realtime = realtime
+        self.packets: List[Tuple[int, bytes]] = []
+        self.position = 0
+        self.start = None
+        self.event = None
+
+    def connect(self):
+        self.dispatch('on_cube_connecting', f"Replaying {self.path}...", 50)
+        try:
+            self.packets = list(read_capture(self.path))
+        except (OSError, ValueError) as e:
+            self.dispatch('on_cube_connecting_failed',
+                          f"Failed to read capture: {str(e)}")
+            return
+        self.position = 0
+        self.dispatch('on_cube_connected')
+        # Packets are dispatched once the app handled the connection.
+        self.event = Clock.schedule_once(lambda td: self.play())
+
+    def disconnect(self):
+        if self.event:
+            self.event.cancel()
+            self.event = None
+        self.dispatch('on_cube_disconnected')
+
+    def play(self):
+        self.start = time.perf_counter_ns() - (
+            self.packets[self.position][0]
+            if self.position < len(self.packets) else 0)
+        if not self.realtime:
+            self.replay_all()
+            return
+        self._play_due()
+
+    # Dispatches all packets that are due, and schedules the next one.
+    # Delays are computed from the start of the replay, so that they do not
+    # accumulate.
+    def _play_due(self, *args):
+        now = time.perf_counter_ns() - self.start
+        while (self.position < len(self.packets) and
+               self.packets[self.position][0] <= now):
+            self.dispatch_packet(*self.packets[self.position])
+            self.position += 1
+        if self.position == len(self.packets):
+            self.event = None
+            self.dispatch('on_replay_finished')
+            return
+        delay = (self.packets[self.position][0] - now) / 1e9
+        self.event = Clock.schedule_once(self._play_due, delay)
+
+    # Dispatches all remaining packets at once, without waiting.
+    def replay_all(self):
+        # Replaces a scheduled play() or _play_due().
+        if self.event:
+            self.event.cancel()
+        if self.start is None:
+            self.start = time.perf_counter_ns()
+        while self.position < len(self.packets):
+            self.dispatch_packet(*self.packets[self.position])
+            self.position += 1
+        self.event = None
+        self.dispatch('on_replay_finished')
+
+    def dispatch_packet(self, offset, packet):
+        # The time the packet was due.
+        ts = self.start + offset
+        latency.tracker.dispatched(latency.tracker.arrived(ts))
+        self.dispatch('on_state_updated', packet, ts)
+
+    def send_command(self, command):
+        print(f"Ignoring command {command:#x} during replay.")
+
+    def reset_cube(self):
+        self.send_command(CUBE_INFO_REQUEST_COMMANDS['RESET_SOLVED'])
+
+    def on_cube_connecting(self, *args):
+        pass
+
+    def on_cube_connecting_failed(self, *args):
+        pass
+
+    def on_cube_connected(self, *args):
+        pass
+
+    def on_cube_disconnected(self, *args):
+        pass
+
+    def on_state_updated(self, *args):
+        pass
+
+    def on_replay_finished(self, *args):
+        pass
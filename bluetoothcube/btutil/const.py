@@ -10,3 +10,10 @@ CLIENT_CHARACTERISTIC_UUID = "00002902-0000-1000-8000-00805f9b34fb"
 CUBE_INFO_REQUEST_COMMANDS = {
     'RESET_SOLVED': 0xA1
 }
+
+# Key used by newer Giiker cubes to encrypt state packets. Encrypted packets
+# are marked with 0xa7 in byte 18, byte 19 selects two offsets into the key.
+GIIKER_KEY = bytes([
+    176, 81, 104, 224, 86, 137, 237, 119, 38, 26, 193, 161, 210, 126, 150, 81,
+    93, 13, 236, 249, 89, 235, 88, 24, 113, 81, 214, 131, 130, 199, 2, 169,
+    39, 165, 171, 41])
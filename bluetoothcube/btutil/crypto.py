@@ -0,0 +1,54 @@
+from bluetoothcube.btutil.const import GIIKER_KEY
+
+# Encryption used by newer Giiker cubes for state packets. Each of the first
+# 18 bytes is offset by two bytes of the key, selected by the nibbles of byte
+# 19. Byte 18 is 0xa7 in encrypted packets.
+#
+# There are only 256 possible combinations of offsets, so they are
+# precomputed. The 18 bytes are then decrypted at once, as a single integer,
+# adding the offsets to all bytes in parallel without carrying between them.
+
+ENCRYPTED_MARKER = 0xa7
+LENGTH = 18
+
+# All bytes but the top bit, and the top bits.
+LOW_BITS = int.from_bytes(b'\x7f' * LENGTH, 'big')
+HIGH_BITS = int.from_bytes(b'\x80' * LENGTH, 'big')
+
+
+def _offsets(k):
+    k1 = k >> 4 & 0xf
+    k2 = k & 0xf
+    return bytes((GIIKER_KEY[i + k1] + GIIKER_KEY[i + k2]) & 0xff
+                 for i in range(LENGTH))
+
+
+# Offsets added by decryption, for each value of byte 19, as integers.
+DECRYPT_OFFSETS = tuple(int.from_bytes(_offsets(k), 'big')
+                        for k in range(256))
+
+
+def _add_bytes(a, b):
+    # Bytewise a + b mod 256: add the low 7 bits of each byte, then set the
+    # top bits.
+    return ((a & LOW_BITS) + (b & LOW_BITS)) ^ ((a ^ b) & HIGH_BITS)
+
+
+def is_encrypted(packet) -> bool:
+    return len(packet) == 20 and packet[18] == ENCRYPTED_MARKER
+
+
+# Returns the decrypted 18 bytes of an encrypted packet. Accepts bytes,
+# bytearray or memoryview.
+def decrypt_packet(packet) -> bytes:
+    data = int.from_bytes(packet[:LENGTH], 'big')
+    return _add_bytes(data, DECRYPT_OFFSETS[packet[19]]).to_bytes(
+        LENGTH, 'big')
+
+
+def encrypt_packet(packet, k) -> bytes:
+    # Adding the two's complement of the offsets subtracts them.
+    negated = bytes(-b & 0xff for b in _offsets(k))
+    data = _add_bytes(int.from_bytes(packet[:LENGTH], 'big'),
+                      int.from_bytes(negated, 'big'))
+    return data.to_bytes(LENGTH, 'big') + bytes([ENCRYPTED_MARKER, k])
@@ -1,14 +1,21 @@
 import kivy
 import gatt
+import time
+from collections import deque
 from threading import Thread
 
+import dbus.mainloop.glib
+from gi.repository import GLib
+
 from kivy.clock import Clock
 from kivy.app import App
 
+from bluetoothcube import latency
 from bluetoothcube.btutil.const import (
     CUBE_STATE_SERVICE, CUBE_STATE_RESPONSE,
     CUBE_INFO_SERVICE, CUBE_INFO_REQUEST, CUBE_INFO_RESPONSE,
     CUBE_INFO_REQUEST_COMMANDS)
+from bluetoothcube.btutil.crypto import decrypt_packet, is_encrypted
 from ldb import ERR_OBJECT_CLASS_MODS_PROHIBITED
 
 
@@ -32,6 +39,10 @@ class BluetoothCubeScanner(kivy.event.EventDispatcher, gatt.DeviceManager):
     def __init__(self):
         self.register_event_type('on_cube_found')
         self.register_event_type('on_paired_cube_found')
+        # dbus is used from kivy's thread as well as from the gobject thread
+        # (see prepare_run), so its thread support must be enabled before
+        # the manager connects to the bus.
+        dbus.mainloop.glib.threads_init()
         super().__init__(adapter_name='hci0')
         self._main_loop = None
         self.devices_found = set()
@@ -41,7 +52,7 @@ class BluetoothCubeScanner(kivy.event.EventDispatcher, gatt.DeviceManager):
     def prepare_run(self):
         """
         Similar to gatt.DeviceManager.run, a custom implementation that does
-        not block, but schedules the gobject main_look within kivy's main loop.
+        not block, but runs the gobject main loop in a separate thread.
         """
         if self._main_loop:
             return  # Already prepared.
@@ -62,24 +73,28 @@ class BluetoothCubeScanner(kivy.event.EventDispatcher, gatt.DeviceManager):
             path_keyword='path')
 
         self._main_loop = GObject.MainLoop()
-        self._main_loop_context = self._main_loop.get_context()
 
         # The GObject loop would eat up our keyboard interrupts, so we rebind
         # SIGINT to the default handler.
         import signal
         signal.signal(signal.SIGINT, sigint_handler)
 
-        # schedule the iteration each frame
-        self._main_loop_schedule = Clock.schedule_interval(
-            self._gobject_iteration, 0)
-
-    def _gobject_iteration(self, td):
-        loop = 0
-        while self._main_loop_context.pending() and loop < 10:
-            self._main_loop_context.iteration(False)
-            loop += 1
-
+        # The loop sleeps until dbus has something for us, and handles it
+        # right away. Polling it from kivy's loop instead would wake up every
+        # frame, and delay bursts of events by a frame per few events. All
+        # dbus callbacks are therefore called from this thread, and must hand
+        # over to kivy's thread with Clock.schedule_once before dispatching
+        # any events.
+        self._main_loop_thread = Thread(
+            target=self._main_loop.run, name='gobject', daemon=True)
+        self._main_loop_thread.start()
+
+    # Scanning runs in the gobject thread, where device_discovered is called
+    # from, so that devices_found is only accessed from that thread.
     def scan(self):
+        GLib.idle_add(self._scan)
+
+    def _scan(self):
         self.devices_found = set()
 
         # Check for already known devices.
@@ -88,9 +103,14 @@ class BluetoothCubeScanner(kivy.event.EventDispatcher, gatt.DeviceManager):
 
         # Await new devices.
         self.start_discovery()
+        return False  # Do not repeat.
 
     def stop_scan(self):
+        GLib.idle_add(self._stop_scan)
+
+    def _stop_scan(self):
         self.stop_discovery()
+        return False
 
     def device_discovered(self, device):
         if device.mac_address in self.devices_found:
@@ -103,9 +123,10 @@ class BluetoothCubeScanner(kivy.event.EventDispatcher, gatt.DeviceManager):
         if name and (name.startswith("Gi")):
             di = DeviceInfo(device.mac_address, name, self)
             if device.is_connected():
-                self.dispatch('on_paired_cube_found', di)
+                event = 'on_paired_cube_found'
             else:
-                self.dispatch('on_cube_found', di)
+                event = 'on_cube_found'
+            Clock.schedule_once(lambda td: self.dispatch(event, di))
 
     def on_cube_found(self, deviceinfo):
         pass
@@ -125,12 +146,26 @@ class BluetoothCubeConnection(gatt.Device, kivy.event.EventDispatcher):
         kivy.event.EventDispatcher.__init__(self)
         gatt.Device.__init__(self, deviceinfo.address, deviceinfo.manager)
 
+        # State packets received in the gobject thread, waiting to be
+        # dispatched in kivy's thread. deque's append and popleft are atomic,
+        # so no lock is needed.
+        self.packets = deque()
+        self.packets_trigger = Clock.create_trigger(self._dispatch_packets)
+
+    # Dispatches an event from kivy's thread. Used by callbacks called from
+    # the gobject thread.
+    def _dispatch_later(self, event, *args):
+        Clock.schedule_once(lambda td: self.dispatch(event, *args))
+
     def connect(self):
         # Again, we customize the connection procedure to make it more
         # UI-friendly by splitting into parts.
         self.dispatch('on_cube_connecting',
                       f"Connecting to {self.alias()}...", 20)
+        # Continue in the gobject thread, which handles the signals.
+        GLib.idle_add(self._connect)
 
+    def _connect(self):
         self._connect_signals()
         device = self  # Used by nested local class
         if not self.is_connected():
@@ -141,6 +176,7 @@ class BluetoothCubeConnection(gatt.Device, kivy.event.EventDispatcher):
             AsyncConnector().start()
         else:
             self.connect_succeeded()
+        return False  # Do not repeat.
 
     def disconnect(self):
         device = self
@@ -154,8 +190,8 @@ class BluetoothCubeConnection(gatt.Device, kivy.event.EventDispatcher):
     # Called when connection is successful.
     def connect_succeeded(self):
         super().connect_succeeded()
-        self.dispatch('on_cube_connecting',
-                      "Initializing cube...", 55)
+        self._dispatch_later('on_cube_connecting',
+                             "Initializing cube...", 55)
 
         # Maybe services were already resolved?
         if not self.services and self.is_services_resolved():
@@ -164,14 +200,14 @@ class BluetoothCubeConnection(gatt.Device, kivy.event.EventDispatcher):
     def disconnect_succeeded(self):
         super().disconnect_succeeded()
         print("Disconnected.")
-        self.dispatch('on_cube_disconnected')
+        self._dispatch_later('on_cube_disconnected')
 
     # Called when services get resolved.
     def services_resolved(self):
         super().services_resolved()
-        self.dispatch('on_cube_connecting',
-                      "Establishing communications...", 85)
-        self.enable_notifications()
+        self._dispatch_later('on_cube_connecting',
+                             "Establishing communications...", 85)
+        Clock.schedule_once(lambda td: self.enable_notifications())
 
     def enable_notifications(self):
         # Find services
@@ -221,24 +257,29 @@ class BluetoothCubeConnection(gatt.Device, kivy.event.EventDispatcher):
     # Called when characteristic values change.
     def characteristic_value_updated(self, characteristic, value):
         if characteristic.uuid == CUBE_STATE_RESPONSE:
+            # Solves are timed from packet arrival, not from when the main
+            # loop gets to handle the packet.
+            ts = time.perf_counter_ns()
+            record = latency.tracker.arrived(ts)
+            value = bytes(value)
+            if is_encrypted(value):
+                value = decrypt_packet(value)
+
             # Dispatch the event from the main event loop, instead of dbus
-            # handler to ensure proper error handling.
-            if value[18] == 0xa7:
-                bla=""
-                key = [176, 81, 104, 224, 86, 137, 237, 119, 38, 26, 193, 161, 210, 126, 150, 81, 93, 13, 236, 249, 89, 235, 88, 24, 113, 81, 214, 131, 130, 199, 2, 169, 39, 165, 171, 41]
-                k = value[19]
-                k1 = k >> 4 & 0xf;
-                k2 = k & 0xf;
-                for i in range(0,len(value)-2):
-                    move = (value[i] + key[i + k1] + key[i + k2]) & 0xff;
-                    bla+="{0:02x}".format(move)
-                value=bytes.fromhex(bla)
-
-            Clock.schedule_once(
-                lambda td: self.dispatch('on_state_updated', value))
+            # handler to ensure proper error handling. Packets that arrive
+            # before the main loop gets to them are dispatched together.
+            self.packets.append((value, ts, record))
+            self.packets_trigger()
         else:
             print(f"Characteristic {characteristic.uuid} changed to {value}")
 
+    def _dispatch_packets(self, td):
+        packets = self.packets
+        while packets:
+            value, ts, record = packets.popleft()
+            latency.tracker.dispatched(record)
+            self.dispatch('on_state_updated', value, ts)
+
     def send_command(self, command):
         # TODO: At the moment this method only supports single-byte commands.
         buffer = [0] * 17
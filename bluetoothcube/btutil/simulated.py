@@ -0,0 +1,183 @@
+import time
+import random
+import threading
+
+import kivy
+from kivy.clock import Clock
+
+from bluetoothcube import latency
+from bluetoothcube.btutil.const import CUBE_INFO_REQUEST_COMMANDS
+from bluetoothcube.btutil.crypto import (
+    decrypt_packet, encrypt_packet, is_encrypted)
+from bluetoothcube.cubestate import (
+    CubieCube, encode_giiker_state, kociemba_move_to_giiker)
+
+from typing import Iterator
+
+# A simulated Giiker cube, for testing the scanner and connection flow and
+# for load testing the app without a cube. The simulated connection has the
+# same events as BluetoothCubeConnection, and produces valid state packets
+# (optionally encrypted, like newer cubes) from a move generator at a fixed
+# number of turns per second. Like the real backends, packets are produced
+# outside of Kivy's thread and handed to it with Clock.schedule_once.
+
+# Giiker cubes only report quarter turns.
+QUARTER_TURNS = [axis * 3 + power for axis in range(6) for power in (0, 2)]
+
+
+def inverse_move(move):
+    axis, power = divmod(move, 3)
+    return axis * 3 + 2 - power
+
+
+def random_moves() -> Iterator[int]:
+    last_axis = None
+    while True:
+        move = random.choice(QUARTER_TURNS)
+        if move // 3 != last_axis:
+            last_axis = move // 3
+            yield move
+
+
+# Scrambles the cube and solves it back by undoing the scramble, forever.
+def scramble_and_solve_moves(length=20) -> Iterator[int]:
+    while True:
+        scramble = []
+        for move in random_moves():
+            scramble.append(move)
+            if len(scramble) == length:
+                break
+        yield from scramble
+        yield from (inverse_move(m) for m in reversed(scramble))
+
+
+class DeviceInfo:
+    def __init__(self, address, name):
+        self.address = address
+        self.name = name
+
+
+class SimulatedCubeScanner(kivy.event.EventDispatcher):
+    def __init__(self):
+        self.register_event_type('on_cube_found')
+        self.register_event_type('on_paired_cube_found')
+        super().__init__()
+
+    def scan(self):
+        deviceinfo = DeviceInfo("00:00:00:00:00:00", "GiS-simulated")
+        Clock.schedule_once(
+            lambda td: self.dispatch('on_cube_found', deviceinfo), 0.5)
+
+    def stop_scan(self):
+        pass
+
+    def on_cube_found(self, deviceinfo):
+        pass
+
+    def on_paired_cube_found(self, deviceinfo):
+        pass
+
+
+class SimulatedCubeConnection(kivy.event.EventDispatcher):
+    def __init__(self, deviceinfo, tps=5.0, encrypted=False,
+                 moves: Iterator[int] = None):
+        self.register_event_type('on_cube_connecting')
+        self.register_event_type('on_cube_connecting_failed')
+        self.register_event_type('on_cube_connected')
+        self.register_event_type('on_cube_disconnected')
+        self.register_event_type('on_state_updated')
+        super().__init__()
+        self.deviceinfo = deviceinfo
+        self.tps = tps
+        self.encrypted = encrypted
+        self.moves = moves or scramble_and_solve_moves()
+        self.cube_state = CubieCube()
+        # Last 4 moves, as reported in bytes 16-19 of plain packets.
+        self.last_moves = bytearray(4)
+        self.lock = threading.Lock()
+        self.running = threading.Event()
+        self.thread = None
+
+    def connect(self):
+        self.dispatch('on_cube_connecting',
+                      f"Connecting to {self.deviceinfo.name}...", 20)
+        # Mimic the connection stages of a real cube.
+        Clock.schedule_once(lambda td: self.dispatch(
+            'on_cube_connecting', "Initializing cube...", 55), 0.2)
+        Clock.schedule_once(lambda td: self.dispatch(
+            'on_cube_connecting', "Establishing communications...", 85), 0.4)
+        Clock.schedule_once(lambda td: self.connected(), 0.6)
+
+    def connected(self):
+        self.dispatch('on_cube_connected')
+        self.running.set()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def disconnect(self):
+        if not self.running.is_set():
+            return
+        self.running.clear()
+        print("Disconnected.")
+        self.dispatch('on_cube_disconnected')
+
+    # Produces packets at the configured rate. Turn times are computed from
+    # the start, so that the rate does not drift.
+    def run(self):
+        interval = 1 / self.tps
+        next_turn = time.perf_counter()
+        for move in self.moves:
+            next_turn += interval
+            delay = next_turn - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            if not self.running.is_set():
+                return
+            packet = self.turn(move)
+            # What the real backends do on packet arrival.
+            ts = time.perf_counter_ns()
+            record = latency.tracker.arrived(ts)
+            if is_encrypted(packet):
+                packet = decrypt_packet(packet)
+            Clock.schedule_once(
+                lambda td, packet=packet, ts=ts, record=record:
+                self.dispatch_packet(packet, ts, record))
+
+    def dispatch_packet(self, packet, ts, record):
+        latency.tracker.dispatched(record)
+        self.dispatch('on_state_updated', packet, ts)
+
+    def turn(self, move) -> bytes:
+        with self.lock:
+            self.cube_state.apply_move(move)
+            self.last_moves[1:] = self.last_moves[:3]
+            self.last_moves[0] = kociemba_move_to_giiker(move)
+            packet = encode_giiker_state(
+                self.cube_state.cp, self.cube_state.co,
+                self.cube_state.ep, self.cube_state.eo) + self.last_moves
+        if self.encrypted:
+            return encrypt_packet(packet, random.randrange(256))
+        return bytes(packet)
+
+    def send_command(self, command):
+        if command == CUBE_INFO_REQUEST_COMMANDS['RESET_SOLVED']:
+            with self.lock:
+                self.cube_state = CubieCube()
+
+    def reset_cube(self):
+        self.send_command(CUBE_INFO_REQUEST_COMMANDS['RESET_SOLVED'])
+
+    def on_cube_connecting(self, *args):
+        pass
+
+    def on_cube_connecting_failed(self, *args):
+        pass
+
+    def on_cube_connected(self, *args):
+        pass
+
+    def on_cube_disconnected(self, *args):
+        pass
+
+    def on_state_updated(self, *args):
+        pass
@@ -1,7 +1,12 @@
 import json
 import datetime
 
-from bluetoothcube.utils import datetime_from_isoformat
+from bluetoothcube.utils import EPOCH, datetime_from_isoformat
+
+from typing import Optional
+
+# Timestamp of times whose stored timestamp could not be parsed.
+UNKNOWN_TS = EPOCH
 
 
 # Function for upgrading time metadata format between releases.
@@ -21,17 +26,20 @@ class Time:
     def __init__(self, time, meta=None):
         self.dnf = False
         self.p2 = False
-        self.meta = meta
-        self.ts = datetime.datetime.utcnow()
+        # Timestamp and metadata of times loaded from a string are kept as
+        # text, and only parsed when accessed. Loading a long history is much
+        # faster that way.
+        self._meta = meta
+        self._meta_str = None
+        self._ts = None
+        self._ts_str = None
         if isinstance(time, float):
             self.time = time
         elif time == 'DNF':
             self.time = None
         elif isinstance(time, str):
             # Parse from string.
-            ts, time, rest = time.split('|', 2)
-            meta = json.loads(rest)
-            self.ts = datetime_from_isoformat(ts)
+            self._ts_str, time, self._meta_str = time.split('|', 2)
             if time == 'DNF':
                 self.time = None
             else:
@@ -39,16 +47,63 @@ class Time:
                     self.p2 = True
                     time = time[:-1]
                 self.time = float(time)
-
-            # TODO: Mark file versions and only use this procedure when loading
-            # an old file version.
-            self.meta = correct_meta(meta)
         else:
             print(f"ERROR: Invalid time {str(time)}")
 
+        if self._ts_str is None:
+            self._ts = datetime.datetime.utcnow()
+
         if self.time is None:
             self.dnf = True
 
+    # Builds a time from fields stored separately, e.g. in a database. The
+    # timestamp and metadata are left as text, like when loading from a
+    # string.
+    @staticmethod
+    def from_fields(ts: str, time: Optional[float], dnf: bool, p2: bool,
+                    meta: str) -> 'Time':
+        res = Time('DNF' if time is None else time)
+        res.dnf = dnf or time is None
+        res.p2 = p2
+        res._ts = None
+        res._ts_str = ts
+        res._meta_str = meta
+        return res
+
+    @property
+    def ts(self) -> datetime.datetime:
+        if self._ts is None:
+            try:
+                self._ts = datetime_from_isoformat(self._ts_str)
+            except ValueError as e:
+                print(f"ERROR: Invalid time timestamp {self._ts_str}: "
+                      f"{str(e)}")
+                self._ts = UNKNOWN_TS
+        return self._ts
+
+    @ts.setter
+    def ts(self, ts: datetime.datetime):
+        self._ts = ts
+
+    @property
+    def meta(self):
+        if self._meta_str is not None:
+            try:
+                # TODO: Mark file versions and only use this procedure when
+                # loading an old file version.
+                self._meta = correct_meta(json.loads(self._meta_str))
+            except ValueError as e:
+                print(f"ERROR: Invalid time metadata {self._meta_str}: "
+                      f"{str(e)}")
+                self._meta = None
+            self._meta_str = None
+        return self._meta
+
+    @meta.setter
+    def meta(self, meta):
+        self._meta = meta
+        self._meta_str = None
+
     def is_dnf(self) -> bool:
         return self.dnf
 
@@ -95,5 +150,8 @@ class Time:
         return f"{self.time:.02f}" + ("" if not self.p2 else "+")
 
     def save(self) -> str:
-        return (self.ts.isoformat() + "|" + str(self) + "|" +
-                json.dumps(self.meta))
+        # Reuse the original text of fields that were never parsed.
+        ts = self._ts_str if self._ts is None else self._ts.isoformat()
+        meta = (self._meta_str if self._meta_str is not None
+                else json.dumps(self._meta))
+        return ts + "|" + str(self) + "|" + meta
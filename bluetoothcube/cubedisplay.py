@@ -1,15 +1,21 @@
 import kivy
+import colorsys
+
+from array import array
 
 from kivy.app import App
-from kivy.vector import Vector
 from kivy.uix.widget import Widget
-from kivy.clock import Clock
 
-from kivy.graphics.vertex_instructions import Rectangle
+from kivy.graphics.texture import Texture
+from kivy.graphics.vertex_instructions import Mesh, Rectangle
 from kivy.graphics.context_instructions import Color
 
 from kociemba.pykociemba.facecube import FaceCube
 
+from bluetoothcube import latency
+
+from typing import List, Tuple
+
 
 STICKERS = {
     'green': [0.33, 0.6, 0.5],
@@ -28,75 +34,153 @@ STICKER_COLOR = {
 }
 
 
+# Position of each face's bottom left corner in the net, in face sizes, in the
+# order of facelets (U, R, F, D, L, B).
+FACE_POSITIONS = [(1, 2), (2, 1), (1, 1), (1, 0), (0, 1), (3, 1)]
+
+# Position of each sticker within a face, in sticker sizes. Facelets are
+# numbered row by row, from the top left.
+STICKER_POSITIONS = [(x, y) for y in (2, 1, 0) for x in (0, 1, 2)]
+
+
+# Draws the cube net with a Color and a Rectangle instruction per sticker.
 class CubeDisplay(Widget):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
 
         self.face_state = FaceCube()
+
+        # The canvas is built once. State changes only update the colors of
+        # stickers that changed, and resizing only moves the stickers.
+        # Color shown by each sticker.
+        self.shown = [None] * 54
+        self.build_canvas()
+        self.update_rect()
         self.update_canvas()
 
         self.bind(pos=self.update_rect,
                   size=self.update_rect)
 
-        self.update_canvas_trigger = Clock.create_trigger(
-            lambda td: self.update_canvas())
-
         App.get_running_app().cube.bind(
-            on_state_changed=self.on_cube_state_changed)
+            on_latest_state=self.on_cube_state_changed)
+
+    def build_canvas(self):
+        self.sticker_colors = []
+        self.sticker_rects = []
+        with self.canvas:
+            for _ in range(54):
+                self.sticker_colors.append(Color())
+                self.sticker_rects.append(Rectangle())
+
+    # Returns the bottom left corner of each sticker, and the sticker size.
+    def get_sticker_layout(self) -> Tuple[List[Tuple[float, float]],
+                                          Tuple[float, float]]:
+        x, y = self.pos[:2]
+        if self.width * 3 > self.height * 4:
+            # Fill to height
+            width, height = 4*self.height/3, self.height
+            x += (self.width - width)/2
+        else:
+            # Fill to width
+            width, height = self.width, 3*self.width/4
+            y += (self.height - height)/2
+
+        sticker_w, sticker_h = width/12, height/9
+
+        positions = []
+        for face_x, face_y in FACE_POSITIONS:
+            for sticker_x, sticker_y in STICKER_POSITIONS:
+                positions.append((x + (face_x*3 + sticker_x) * sticker_w,
+                                  y + (face_y*3 + sticker_y) * sticker_h))
+        return positions, (sticker_w, sticker_h)
 
     def update_rect(self, *args):
-        self.update_canvas()
+        positions, size = self.get_sticker_layout()
+        for rect, pos in zip(self.sticker_rects, positions):
+            rect.pos = pos
+            rect.size = size
 
     def update_canvas(self):
-        self.canvas.clear()
+        colors = self.face_state.f
+        shown = self.shown
+        for i in range(54):
+            if colors[i] != shown[i]:
+                self.sticker_colors[i].hsv = STICKERS[STICKER_COLOR[colors[i]]]
+                shown[i] = colors[i]
 
-        # TODO: Maybe it's possible to recompute all coordinates without
-        # recreating the canvas. It may be a very complex task, though.
-
-        with self.canvas:
-            pos = Vector(self.pos[:2])
-            if self.width * 3 > self.height * 4:
-                # Fill to height
-                area_size = Vector(4*self.height/3, self.height)
-                origin = pos + Vector((self.width - area_size[0])/2, 0)
-            else:
-                # Fill to width
-                area_size = Vector(self.width, 3*self.width/4)
-                origin = pos + Vector(0, (self.height - area_size[1])/2)
-
-            sticker_v = area_size / Vector(12, 9)
-            face_v = area_size / Vector(4, 3)
-
-            def face(x, y):
-                return origin + face_v * (x, y)
-
-            def draw_face(o, n):
-                Color(hsv=STICKERS[STICKER_COLOR[self.face_state.f[n + 0]]])
-                Rectangle(pos=o+(sticker_v*(0, 2)), size=sticker_v)
-                Color(hsv=STICKERS[STICKER_COLOR[self.face_state.f[n + 1]]])
-                Rectangle(pos=o+(sticker_v*(1, 2)), size=sticker_v)
-                Color(hsv=STICKERS[STICKER_COLOR[self.face_state.f[n + 2]]])
-                Rectangle(pos=o+(sticker_v*(2, 2)), size=sticker_v)
-                Color(hsv=STICKERS[STICKER_COLOR[self.face_state.f[n + 3]]])
-                Rectangle(pos=o+(sticker_v*(0, 1)), size=sticker_v)
-                Color(hsv=STICKERS[STICKER_COLOR[self.face_state.f[n + 4]]])
-                Rectangle(pos=o+(sticker_v*(1, 1)), size=sticker_v)
-                Color(hsv=STICKERS[STICKER_COLOR[self.face_state.f[n + 5]]])
-                Rectangle(pos=o+(sticker_v*(2, 1)), size=sticker_v)
-                Color(hsv=STICKERS[STICKER_COLOR[self.face_state.f[n + 6]]])
-                Rectangle(pos=o+(sticker_v*(0, 0)), size=sticker_v)
-                Color(hsv=STICKERS[STICKER_COLOR[self.face_state.f[n + 7]]])
-                Rectangle(pos=o+(sticker_v*(1, 0)), size=sticker_v)
-                Color(hsv=STICKERS[STICKER_COLOR[self.face_state.f[n + 8]]])
-                Rectangle(pos=o+(sticker_v*(2, 0)), size=sticker_v)
-
-            draw_face(face(1, 2), 0 * 9)  # U
-            draw_face(face(2, 1), 1 * 9)  # R
-            draw_face(face(1, 1), 2 * 9)  # F
-            draw_face(face(1, 0), 3 * 9)  # D
-            draw_face(face(0, 1), 4 * 9)  # L
-            draw_face(face(3, 1), 5 * 9)  # B
+        latency.tracker.displayed()
 
+    # Called at most once per frame, so the canvas is updated right away.
     def on_cube_state_changed(self, cube, newstate):
         self.face_state = newstate.toFaceCube()
-        self.update_canvas_trigger()
+        latency.tracker.display_pending()
+        self.update_canvas()
+
+
+# Draws the whole cube net as a single Mesh, in one draw call. Sticker colors
+# are looked up in a palette texture with one texel per color, so recoloring a
+# sticker only changes the texture coordinates of its vertices in the
+# preallocated vertex array. This works with Kivy's default shader.
+class CubeMeshDisplay(CubeDisplay):
+    # x, y, u, v
+    VERTEX_SIZE = 4
+    # Floats per sticker, 4 vertices each.
+    STICKER_SIZE = 4 * VERTEX_SIZE
+
+    def build_canvas(self):
+        self.vertices = array('f', bytes(4 * 54 * self.STICKER_SIZE))
+        indices = []
+        for i in range(0, 54 * 4, 4):
+            indices += [i, i + 1, i + 2, i + 2, i + 3, i]
+        # The palette is a single row of texels, sample its middle.
+        for k in range(3, len(self.vertices), self.VERTEX_SIZE):
+            self.vertices[k] = 0.5
+
+        self.palette = Texture.create(
+            size=(len(STICKER_COLOR), 1), colorfmt='rgba')
+        self.palette.min_filter = 'nearest'
+        self.palette.mag_filter = 'nearest'
+        self.fill_palette(self.palette)
+        # Textures need to be refilled when the GL context is lost.
+        self.palette.add_reload_observer(self.fill_palette)
+
+        with self.canvas:
+            Color(1, 1, 1)
+            self.mesh = Mesh(vertices=self.vertices, indices=indices,
+                             mode='triangles', texture=self.palette)
+
+    def fill_palette(self, texture):
+        buffer = bytearray()
+        for i in range(len(STICKER_COLOR)):
+            rgb = colorsys.hsv_to_rgb(*STICKERS[STICKER_COLOR[i]])
+            buffer += bytes(round(c * 255) for c in rgb) + b'\xff'
+        texture.blit_buffer(bytes(buffer), colorfmt='rgba',
+                            bufferfmt='ubyte')
+
+    def update_rect(self, *args):
+        positions, (w, h) = self.get_sticker_layout()
+        v = self.vertices
+        for k, (x, y) in zip(range(0, len(v), self.STICKER_SIZE), positions):
+            v[k], v[k + 1] = x, y
+            v[k + 4], v[k + 5] = x + w, y
+            v[k + 8], v[k + 9] = x + w, y + h
+            v[k + 12], v[k + 13] = x, y + h
+        self.mesh.vertices = v
+
+    def update_canvas(self):
+        colors = self.face_state.f
+        shown = self.shown
+        v = self.vertices
+        changed = False
+        for i in range(54):
+            if colors[i] != shown[i]:
+                # Center of the color's texel.
+                u = (colors[i] + 0.5) / len(STICKER_COLOR)
+                k = i * self.STICKER_SIZE
+                v[k + 2] = v[k + 6] = v[k + 10] = v[k + 14] = u
+                shown[i] = colors[i]
+                changed = True
+        if changed:
+            self.mesh.vertices = v
+
+        latency.tracker.displayed()
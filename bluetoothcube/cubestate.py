@@ -1,5 +1,5 @@
 import kociemba.pykociemba as kociemba
-from kociemba.pykociemba.cubiecube import CubieCube as KCubieCube
+from kociemba.pykociemba.cubiecube import CubieCube as KCubieCube, moveCube
 from kociemba.pykociemba.facecube import FaceCube as KFaceCube
 
 from typing import List
@@ -48,101 +48,245 @@ EOK = ['UR', 'UF', 'UL', 'UB',
 MOVES_GIIKER_TO_KOCIEMBA = [None, 5, 3, 4, 0, 1, 2]
 
 
+# The tables below precompute the entire Giiker -> Kociemba translation, so
+# that decoding a state packet is only a handful of table lookups per cubie.
+#
+# TODO: I believe the translation can be derived by getting a CubieCube in
+# Giiker order, converting to a FaceCube, swapping colors from Kociemba color
+# scheme and cube orientation to WCA color scheme and cube orientation, then
+# converting back to a CubieCube. This would also require reading edge data in
+# slightly different order.
+
+def _nibble_lut(nibble, decode):
+    # Maps every possible byte value to the decoded value of one of its
+    # nibbles. Nibble 0 is the high nibble.
+    shift = 4 if nibble % 2 == 0 else 0
+    return tuple(decode(b >> shift & 0xF) for b in range(256))
+
+
+def _permutation_lut(nibble, inverse):
+    # Giiker stores cubie numbers starting at 1. Out-of-range values are
+    # marked with -1 and rejected by the decoder.
+    return _nibble_lut(
+        nibble, lambda n: inverse[n - 1] if 1 <= n <= len(inverse) else -1)
+
+
+def _corner_twists(slot):
+    # For each Giiker orientation (index 0-2) and each corner cubie (index
+    # 0-7), the Kociemba orientation of the cubie in this slot.
+    res = []
+    for orig_orient in range(3):
+        # Get the face that g/b sticker is at
+        gb_direction = COG[slot][orig_orient]
+        # Find the clockwise twists wrg. the g/b sticker
+        gb_index = COK[slot].index(gb_direction)
+        # Go from g/b sticker to w/y sticker
+        res += [(gb_index + CT[cubie]) % 3 for cubie in range(8)]
+    return tuple(res)
+
+
+def _edge_flips(slot):
+    # For each Giiker orientation (index 0-1) and each edge cubie (index
+    # 0-15, only 0-11 are valid), the Kociemba orientation of the cubie in this
+    # slot.
+    res = []
+    for orig_orient in range(2):
+        # Get the face that r/o/b/g sticker is at
+        bgwy_direction = EOG[slot][orig_orient]
+        # Find the clockwise twists wrg. the g/b sticker
+        bgwy_index = EOK[slot].index(bgwy_direction)
+        # Go from r/o/b/g sticker to w/y/b/g sticker
+        res += [(bgwy_index + ET[cubie]) % 2 for cubie in range(12)]
+        res += [0] * 4
+    return tuple(res)
+
+
+# Each entry describes one Kociemba slot: the index of the packet byte that
+# holds its data, and a table that decodes that byte.
+CP_DECODE = tuple((CPP[slot] // 2, _permutation_lut(CPP[slot], iCPP))
+                  for slot in range(8))
+EP_DECODE = tuple((8 + EPP[slot] // 2, _permutation_lut(EPP[slot], iEPP))
+                  for slot in range(12))
+
+# Orientation entries additionally carry a table indexed with the decoded
+# orientation offset plus the cubie in that slot. Decoded orientation offsets
+# are premultiplied by the number of cubies, so that no arithmetic is needed
+# in the decoder.
+CO_DECODE = tuple((4 + CPP[slot] // 2,
+                   _nibble_lut(CPP[slot], lambda n: (n % 3) * 8),
+                   _corner_twists(slot))
+                  for slot in range(8))
+EO_DECODE = tuple((14 + EPP[slot] // 8,
+                   tuple((b >> (7 - EPP[slot] % 8) & 1) * 16
+                         for b in range(256)),
+                   _edge_flips(slot))
+                  for slot in range(12))
+
+
+def decode_giiker_state(s):
+    """Decodes a Giiker state packet into Kociemba cp, co, ep and eo lists."""
+    cp = [lut[s[i]] for i, lut in CP_DECODE]
+    ep = [lut[s[i]] for i, lut in EP_DECODE]
+    if -1 in cp or -1 in ep:
+        raise ValueError(f"Invalid Giiker state: {bytes(s[0:16]).hex()}")
+    co = [twists[orient[s[i]] + cubie]
+          for (i, orient, twists), cubie in zip(CO_DECODE, cp)]
+    eo = [flips[orient[s[i]] + cubie]
+          for (i, orient, flips), cubie in zip(EO_DECODE, ep)]
+    return cp, co, ep, eo
+
+
+def encode_giiker_state(cp, co, ep, eo) -> bytearray:
+    """Encodes Kociemba cp, co, ep and eo lists into the first 16 bytes of a
+    Giiker state packet. The inverse of decode_giiker_state."""
+    nibbles = [0] * 28
+    for slot, (i, orient, twists) in enumerate(CO_DECODE):
+        nibbles[CPP[slot]] = CPP[cp[slot]] + 1
+        # Giiker reports unturned corners as 3.
+        nibbles[8 + CPP[slot]] = next(
+            n for n in (3, 1, 2)
+            if twists[(n % 3) * 8 + cp[slot]] == co[slot])
+    for slot in range(12):
+        nibbles[16 + EPP[slot]] = EPP[ep[slot]] + 1
+    res = bytearray(nibbles[2 * i] << 4 | nibbles[2 * i + 1]
+                    for i in range(14))
+    res += bytes(2)
+    for slot, (i, orient, flips) in enumerate(EO_DECODE):
+        if flips[ep[slot]] != eo[slot]:
+            res[i] |= 1 << (7 - EPP[slot] % 8)
+    return res
+
+
+def _move_table(axis, power):
+    c = KCubieCube()
+    for i in range(power):
+        c.multiply(moveCube[axis])
+    return (tuple(c.cp), tuple(c.co), tuple(c.ep), tuple(c.eo))
+
+
+# The effect of each face turn on a cube, indexed with Kociemba move numbers
+# (axis * 3 + power - 1). These are the same moves as in Kociemba's moveCube,
+# but with all powers precomputed.
+MOVE_TABLES = tuple(_move_table(axis, power)
+                    for axis in range(6) for power in range(1, 4))
+
+
+def giiker_move_to_kociemba(m):
+    """Translates a Giiker move byte into a Kociemba move number."""
+    axis = MOVES_GIIKER_TO_KOCIEMBA[(m >> 4) & 0x0F]
+    power = 1 if (m & 0x0F) == 1 else 3
+    return axis * 3 + power - 1
+
+
+def kociemba_move_to_giiker(move):
+    """Translates a Kociemba quarter turn number into a Giiker move byte."""
+    axis, power = divmod(move, 3)
+    return MOVES_GIIKER_TO_KOCIEMBA.index(axis) << 4 | (1 if power == 0 else 3)
+
+
 # Extend CubieCube implementation with our custom mechanisms.
 class CubieCube(KCubieCube):
     def __init__(self, **kwargs):
         if 'giiker_state' in kwargs:
-            s = kwargs['giiker_state']
-
-            super().__init__()
-
-            # TODO: I believe this entire algoritm can be reimplemented by
-            # getting a CubieCube in Giiker order, converting to a FaceCube,
-            # swapping colors from Kociemba color scheme and cube orientation
-            # to WCA color scheme and cube orientation, then converting back to
-            # a CubieCube. This would also require reading edge data in
-            # slightly different order.
-
-            gcp = [(s[0] >> 4 & 0xF) - 1, (s[0] >> 0 & 0xF) - 1,
-                   (s[1] >> 4 & 0xF) - 1, (s[1] >> 0 & 0xF) - 1,
-                   (s[2] >> 4 & 0xF) - 1, (s[2] >> 0 & 0xF) - 1,
-                   (s[3] >> 4 & 0xF) - 1, (s[3] >> 0 & 0xF) - 1]
-            gco = [(s[4] >> 4 & 0xF) % 3, (s[4] >> 0 & 0xF) % 3,
-                   (s[5] >> 4 & 0xF) % 3, (s[5] >> 0 & 0xF) % 3,
-                   (s[6] >> 4 & 0xF) % 3, (s[6] >> 0 & 0xF) % 3,
-                   (s[7] >> 4 & 0xF) % 3, (s[7] >> 0 & 0xF) % 3]
-            gep = [(s[8] >> 4 & 0xF) - 1, (s[8] >> 0 & 0xF) - 1,
-                   (s[9] >> 4 & 0xF) - 1, (s[9] >> 0 & 0xF) - 1,
-                   (s[10] >> 4 & 0xF) - 1, (s[10] >> 0 & 0xF) - 1,
-                   (s[11] >> 4 & 0xF) - 1, (s[11] >> 0 & 0xF) - 1,
-                   (s[12] >> 4 & 0xF) - 1, (s[12] >> 0 & 0xF) - 1,
-                   (s[13] >> 4 & 0xF) - 1, (s[13] >> 0 & 0xF) - 1]
-            geo = [s[14] >> 7 & 1, s[14] >> 6 & 1,
-                   s[14] >> 5 & 1, s[14] >> 4 & 1,
-                   s[14] >> 3 & 1, s[14] >> 2 & 1,
-                   s[14] >> 1 & 1, s[14] >> 0 & 1,
-                   s[15] >> 7 & 1, s[15] >> 6 & 1,
-                   s[15] >> 5 & 1, s[15] >> 4 & 1]
-
-            self.cp = [iCPP[gcp[i]] for i in CPP]
-            self.ep = [iEPP[gep[i]] for i in EPP]
-
-            for slot in range(0, 8):
-                # Get the giiker orientation of this corner
-                orig_orient = gco[CPP[slot]]
-
-                # Get the face that g/b sticker is at
-                gb_direction = COG[slot][orig_orient]
-
-                # Find the clockwise twists wrg. the g/b sticker
-                gb_index = COK[slot].index(gb_direction)
-
-                # Go from g/b sticker to w/y sticker
-                cubie = self.cp[slot]
-                wy_index = (gb_index + CT[cubie]) % 3
-
-                self.co[slot] = wy_index
-
-            for slot in range(0, 12):
-                # Get the giiker orientation of this edge
-                orig_orient = geo[EPP[slot]]
-
-                # Get the face that r/o/b/g sticker is at
-                bgwy_direction = EOG[slot][orig_orient]
-
-                # Find the clockwise twists wrg. the g/b sticker
-                bgwy_index = EOK[slot].index(bgwy_direction)
-
-                # Go from r/o/b/g sticker to w/y/b/g sticker
-                cubie = self.ep[slot]
-                wybg_index = (bgwy_index + ET[cubie]) % 2
-
-                self.eo[slot] = wybg_index
-
+            # No need to call the base constructor, the decoder produces
+            # all four arrays.
+            self.cp, self.co, self.ep, self.eo = decode_giiker_state(
+                kwargs['giiker_state'])
         else:
             # Use standard constructor
             super().__init__(**kwargs)
+        self.state_changed()
+
+    # Drops values cached for the current state. All methods that modify
+    # cp/co/ep/eo must call this.
+    #
+    # Everything derived from the state is computed lazily and at most once
+    # per state, so that all listeners of a state change share the work.
+    def state_changed(self):
+        self._key = None
+        self._cubie_bits = None
+        self._facecube = None
+        self._representation_strings = None
+
+    def key(self) -> int:
+        # Packs the entire state into a single integer, which can be cheaply
+        # compared and used as a dictionary key.
+        if self._key is None:
+            self._key = int.from_bytes(
+                bytes(self.cp + self.co + self.ep + self.eo), 'big')
+        return self._key
+
+    def cubie_bits(self) -> int:
+        # One-hot encoding of the state, used for pattern matching. Each slot
+        # gets 24 bits, with the bit for its (cubie, orientation) pair set.
+        # Corner slots come first, followed by edge slots.
+        if self._cubie_bits is None:
+            bits = 0
+            for slot, (c, o) in enumerate(zip(self.cp, self.co)):
+                bits |= 1 << (slot * 24 + c * 3 + o)
+            for slot, (e, o) in enumerate(zip(self.ep, self.eo)):
+                bits |= 1 << (8 * 24 + slot * 24 + e * 2 + o)
+            self._cubie_bits = bits
+        return self._cubie_bits
+
+    def apply_move(self, move):
+        # Applies a move (given as Kociemba move number) to this cube, in
+        # place. This is equivalent to multiplying by moveCube, but a lot
+        # faster.
+        mcp, mco, mep, meo = MOVE_TABLES[move]
+        cp, co, ep, eo = self.cp, self.co, self.ep, self.eo
+        self.cp[:] = [cp[i] for i in mcp]
+        self.co[:] = [(co[i] + o) % 3 for i, o in zip(mcp, mco)]
+        self.ep[:] = [ep[i] for i in mep]
+        self.eo[:] = [(eo[i] + o) % 2 for i, o in zip(mep, meo)]
+        self.state_changed()
+
+    def cornerMultiply(self, b):
+        super().cornerMultiply(b)
+        self.state_changed()
+
+    def edgeMultiply(self, b):
+        super().edgeMultiply(b)
+        self.state_changed()
 
     def __eq__(self, other):
-        return (self.cp == other.cp and self.co == other.co and
-                self.ep == other.ep and self.eo == other.eo)
+        return self.key() == other.key()
 
     def is_solved(self):
-        return (self.cp == list(range(0, 8)) and
-                self.co == list([0] * 8) and
-                self.ep == list(range(0, 12)) and
-                self.eo == list([0] * 12))
+        return self.key() == SOLVED_KEY
+
+    def matches_any(self, patterns: 'PatternSet') -> bool:
+        # Same as self.toFaceCube().matches_any(patterns), but without
+        # computing facelets.
+        bits = self.cubie_bits()
+        for mask in patterns.cubie_masks:
+            if bits & mask == 0:
+                return True
+        return False
 
-    def get_representation_strings(self):
-        return [' '.join(str(cp) for cp in self.cp),
+    # The returned list is shared by all callers, do not modify it.
+    def get_representation_strings(self) -> List[str]:
+        if self._representation_strings is None:
+            self._representation_strings = [
+                ' '.join(str(cp) for cp in self.cp),
                 ' '.join(str(co) for co in self.co),
                 ' '.join(str(ep) for ep in self.ep),
                 ' '.join(str(eo) for eo in self.eo), ]
+        return self._representation_strings
 
+    # The returned facecube is shared by all callers, do not modify it.
     def toFaceCube(self):
-        facecube = super().toFaceCube()
-        # Return our custom facecube subclass
-        return FaceCube(facecube.f)
+        if self._facecube is None:
+            facecube = super().toFaceCube()
+            # Return our custom facecube subclass
+            self._facecube = FaceCube(facecube.f)
+        return self._facecube
+
+
+SOLVED_KEY = CubieCube().key()
+# The first 16 bytes of the state packet of a solved cube.
+SOLVED_GIIKER_STATE = bytes(encode_giiker_state(
+    CubieCube().cp, CubieCube().co, CubieCube().ep, CubieCube().eo))
 
 
 class FaceCube(KFaceCube):
@@ -242,6 +386,8 @@ L L L F F F R R R B B B
         return res
 
     def matches_any(self, patterns: List['FaceCube']) -> bool:
+        if isinstance(patterns, PatternSet):
+            return patterns.matched_by(self)
         for pattern in patterns:
             if self.matches(pattern):
                 return True
@@ -252,3 +398,70 @@ L L L F F F R R R B B B
             if p != -1 and x != p:
                 return False
         return True
+
+    def to_int(self) -> int:
+        # Packs facelets into an integer, one byte per facelet. Only valid for
+        # cubes with all facelet colors known.
+        return int.from_bytes(bytes(self.f), 'big')
+
+
+# Computes the set of cubie states forbidden by a facelet pattern, as a mask
+# in the CubieCube.cubie_bits() layout. A cube matches the pattern exactly when
+# none of its bits are in that mask.
+def _cubie_mask(pattern: FaceCube) -> int:
+    f = pattern.f
+    if any(f[c * 9 + 4] not in (-1, c) for c in range(6)):
+        # Center colors never match, forbid all states.
+        return (1 << (20 * 24)) - 1
+
+    forbidden = 0
+    for slot, facelets in enumerate(KFaceCube.cornerFacelet):
+        for cubie, colors in enumerate(KFaceCube.cornerColor):
+            for ori in range(3):
+                for n in range(3):
+                    p = f[facelets[(n + ori) % 3]]
+                    if p != -1 and p != colors[n]:
+                        forbidden |= 1 << (slot * 24 + cubie * 3 + ori)
+                        break
+    for slot, facelets in enumerate(KFaceCube.edgeFacelet):
+        for cubie, colors in enumerate(KFaceCube.edgeColor):
+            for ori in range(2):
+                for n in range(2):
+                    p = f[facelets[(n + ori) % 2]]
+                    if p != -1 and p != colors[n]:
+                        forbidden |= 1 << (8 * 24 + slot * 24 +
+                                           cubie * 2 + ori)
+                        break
+    return forbidden
+
+
+# A list of patterns, additionally compiled into bitmasks. Each pattern is
+# stored as a (mask, value) pair of integers, with the same layout as
+# FaceCube.to_int(). A cube matches a pattern when its packed facelets,
+# masked with the pattern's mask, are equal to the pattern's value. Facelets
+# that the pattern does not care about are zero in both.
+#
+# Patterns are also compiled into cubie-level masks, see _cubie_mask and
+# CubieCube.matches_any.
+class PatternSet(list):
+    def __init__(self, patterns: List[FaceCube]):
+        super().__init__(patterns)
+        masks = []
+        cubie_masks = []
+        for pattern in patterns:
+            mask = int.from_bytes(
+                bytes(0xFF if x >= 0 else 0 for x in pattern.f), 'big')
+            value = int.from_bytes(
+                bytes(x if x >= 0 else 0 for x in pattern.f), 'big')
+            if (mask, value) not in masks:
+                masks.append((mask, value))
+                cubie_masks.append(_cubie_mask(pattern))
+        self.masks = tuple(masks)
+        self.cubie_masks = tuple(cubie_masks)
+
+    def matched_by(self, cube: FaceCube) -> bool:
+        state = cube.to_int()
+        for mask, value in self.masks:
+            if state & mask == value:
+                return True
+        return False
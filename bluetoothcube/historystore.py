@@ -0,0 +1,232 @@
+import sys
+import math
+import mmap
+import struct
+import datetime
+
+from array import array
+
+from bluetoothcube.common import Time
+from bluetoothcube.utils import EPOCH, epoch_microseconds
+
+from typing import Dict, List, Optional
+
+# A compact, columnar binary format for solve history. Instead of one object
+# per solve, the history is kept as a few arrays: times, timestamps, flags and
+# one column per solve stage. A file in this format can be memory-mapped, so
+# opening it does not depend on the history length.
+#
+# Only stage times are kept from solve metadata, as that is the only metadata
+# the app records.
+#
+# TimeHistory.use_binary_file() keeps the history in this format. Files can
+# also be converted by hand with:
+#   python3 -m bluetoothcube.historystore times.txt times.bin
+
+FILE_MAGIC = b'BCHS'
+FILE_VERSION = 2
+
+# Magic, version, byte order (0 - little, 1 - big), number of stages, number
+# of solves.
+HEADER = struct.Struct('<4sBBHI')
+STAGE_NAME = struct.Struct('<16s')
+
+FLAG_DNF = 0x01
+FLAG_P2 = 0x02
+FLAG_META = 0x04  # Solve has metadata (even if it has no stage times).
+FLAG_STAGES = 0x08  # Metadata has stage times (even if the list is empty).
+
+
+def _byteorder():
+    return 0 if sys.byteorder == 'little' else 1
+
+
+class HistoryColumns:
+    def __init__(self, times, timestamps, flags, stages: Dict[str, array]):
+        # Solve time in seconds, NaN for DNFs without a time.
+        self.times = times
+        # Microseconds since epoch, UTC.
+        self.timestamps = timestamps
+        # FLAG_* bits.
+        self.flags = flags
+        # Stage name -> stage time in seconds, NaN where not available.
+        self.stages = stages
+
+    def __len__(self):
+        return len(self.times)
+
+    @staticmethod
+    def from_times(data: List[Time]) -> 'HistoryColumns':
+        times = array('d')
+        timestamps = array('q')
+        flags = bytearray()
+        stages: Dict[str, array] = {}
+        for i, t in enumerate(data):
+            times.append(math.nan if t.time is None else t.time)
+            timestamps.append(epoch_microseconds(t.ts))
+            meta = t.meta
+            flags.append((FLAG_DNF if t.is_dnf() else 0) |
+                         (FLAG_P2 if t.is_p2() else 0) |
+                         (FLAG_META if meta is not None else 0) |
+                         (FLAG_STAGES if meta and 'stage_times' in meta
+                          else 0))
+            stage_times = (meta or {}).get('stage_times', [])
+            if len(set(name for name, _ in stage_times)) < len(stage_times):
+                raise ValueError(
+                    f"Solve {i} has more than one time for a stage")
+            for name, stage_time in stage_times:
+                if len(name.encode()) > STAGE_NAME.size:
+                    raise ValueError(f"Stage name {name!r} is longer than "
+                                     f"{STAGE_NAME.size} bytes")
+                if name not in stages:
+                    stages[name] = array('f', [math.nan] * i)
+                stages[name].append(stage_time)
+            for column in stages.values():
+                if len(column) == i:
+                    column.append(math.nan)
+        return HistoryColumns(times, timestamps, flags, stages)
+
+    @staticmethod
+    def load(path) -> 'HistoryColumns':
+        # Columns of the returned object are views of a read-only memory map.
+        with open(path, 'rb') as f:
+            data = memoryview(mmap.mmap(f.fileno(), 0,
+                                        access=mmap.ACCESS_READ))
+
+        magic, version, byteorder, stage_count, n = HEADER.unpack_from(data)
+        if (magic != FILE_MAGIC or version not in (1, FILE_VERSION) or
+                byteorder != _byteorder()):
+            raise ValueError(f"{path} is not a compatible history file")
+
+        offset = HEADER.size
+        names = []
+        for i in range(stage_count):
+            name, = STAGE_NAME.unpack_from(data, offset)
+            names.append(name.rstrip(b'\0').decode())
+            offset += STAGE_NAME.size
+
+        def column(typecode):
+            nonlocal offset
+            offset += -offset % 8
+            size = n * array(typecode).itemsize
+            if offset + size > len(data):
+                raise ValueError(f"{path} is truncated")
+            res = data[offset:offset + size].cast(typecode)
+            offset += size
+            return res
+
+        times = column('d')
+        timestamps = column('q')
+        stages = {name: column('f') for name in names}
+        flags = column('B')
+        if version == 1:
+            # Version 1 had no FLAG_STAGES, all metadata had stage times.
+            flags = bytearray(f | FLAG_STAGES if f & FLAG_META else f
+                              for f in flags)
+        return HistoryColumns(times, timestamps, flags, stages)
+
+    def save(self, path):
+        n = len(self)
+        with open(path, 'wb') as f:
+            f.write(HEADER.pack(FILE_MAGIC, FILE_VERSION, _byteorder(),
+                                len(self.stages), n))
+            for name in self.stages:
+                if len(name.encode()) > STAGE_NAME.size:
+                    raise ValueError(f"Stage name {name!r} is longer than "
+                                     f"{STAGE_NAME.size} bytes")
+                f.write(STAGE_NAME.pack(name.encode()))
+
+            def column(data, typecode):
+                f.write(b'\0' * (-f.tell() % 8))
+                f.write(array(typecode, data).tobytes())
+
+            column(self.times, 'd')
+            column(self.timestamps, 'q')
+            for stage in self.stages.values():
+                column(stage, 'f')
+            column(self.flags, 'B')
+
+    def get_time(self, i) -> Time:
+        return ColumnTime(self, i)
+
+    def get_meta(self, i) -> Optional[dict]:
+        if not self.flags[i] & FLAG_META:
+            return None
+        if not self.flags[i] & FLAG_STAGES:
+            return {}
+        # Stage times are stored with single precision, round them to
+        # milliseconds to get back the short representation.
+        return {'stage_times': [
+            [name, round(column[i], 3)]
+            for name, column in self.stages.items()
+            if not math.isnan(column[i])]}
+
+    def to_times(self) -> List[Time]:
+        return [self.get_time(i) for i in range(len(self))]
+
+
+# A time read from HistoryColumns. Like times loaded from times.txt, its
+# timestamp and metadata are only read from the columns when accessed, so
+# that loading a long history stays fast.
+class ColumnTime(Time):
+    def __init__(self, columns: HistoryColumns, i: int):
+        flags = columns.flags[i]
+        t = columns.times[i]
+        self.time = None if math.isnan(t) else t
+        self.dnf = self.time is None or bool(flags & FLAG_DNF)
+        self.p2 = bool(flags & FLAG_P2)
+        self._ts = None
+        self._ts_str = None
+        self._meta = None
+        self._meta_str = None
+        self._meta_loaded = False
+        self.columns = columns
+        self.index = i
+
+    @property
+    def ts(self) -> datetime.datetime:
+        if self._ts is None:
+            self._ts = EPOCH + datetime.timedelta(
+                microseconds=self.columns.timestamps[self.index])
+        return self._ts
+
+    @ts.setter
+    def ts(self, ts: datetime.datetime):
+        self._ts = ts
+
+    @property
+    def meta(self):
+        if not self._meta_loaded:
+            self._meta = self.columns.get_meta(self.index)
+            self._meta_loaded = True
+        return self._meta
+
+    @meta.setter
+    def meta(self, meta):
+        self._meta = meta
+        self._meta_loaded = True
+
+    def save(self) -> str:
+        self.ts, self.meta
+        return super().save()
+
+
+def convert(src, dst):
+    # Converts between times.txt and the binary format, in the direction
+    # indicated by file extensions.
+    if src.endswith('.txt'):
+        with open(src, 'r') as f:
+            data = [Time(line.strip()) for line in f if line.strip()]
+        HistoryColumns.from_times(data).save(dst)
+    else:
+        with open(dst, 'w') as f:
+            for t in HistoryColumns.load(src).to_times():
+                f.write(t.save() + "\n")
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        print(f"Usage: {sys.argv[0]} times.txt times.bin")
+        print(f"       {sys.argv[0]} times.bin times.txt")
+        sys.exit(1)
+    convert(sys.argv[1], sys.argv[2])
@@ -0,0 +1,229 @@
+import os
+import sys
+import mmap
+import struct
+import importlib.abc
+import importlib.machinery
+import importlib.util
+
+from array import array
+from threading import Lock
+
+# The pure-Python Kociemba solver builds (or unpickles) its move and pruning
+# tables when kociemba.pykociemba.coordcube is imported. That takes seconds
+# on a phone, and minutes if the tables have to be generated. This module
+# replaces coordcube with a compatible implementation that loads the tables
+# lazily, on first use, from a compact binary file that is memory-mapped.
+#
+# The binary file is generated from the original tables on first use and
+# stored in the directory set with use_directory(). The tables are mapped
+# read-only, and the module has no setPruning(): the solver only reads them.
+
+MODULE_NAME = 'kociemba.pykociemba.coordcube'
+FILE_NAME = 'kociemba-tables.bin'
+FILE_MAGIC = b'KCTB'
+FILE_VERSION = 1
+
+# Names of tables used by the solver. Move tables are two-dimensional,
+# pruning tables are flat arrays of bytes.
+MOVE_TABLES = ['twistMove', 'flipMove', 'FRtoBR_Move', 'URFtoDLF_Move',
+               'URtoDF_Move', 'URtoUL_Move', 'UBtoDF_Move',
+               'MergeURtoULandUBtoDF']
+PRUNING_TABLES = ['Slice_URFtoDLF_Parity_Prun', 'Slice_URtoDF_Parity_Prun',
+                  'Slice_Twist_Prun', 'Slice_Flip_Prun']
+
+# Magic, version, byte order (0 - little, 1 - big), number of tables.
+HEADER = struct.Struct('<4sBB2xI')
+# Name, array typecode, rows, columns (0 for flat tables), data offset.
+ENTRY = struct.Struct('<32sc3xIIQ')
+
+_directory = None
+_load_lock = Lock()
+
+
+def use_directory(directory):
+    global _directory
+    _directory = directory
+
+
+def install():
+    # Must be called before kociemba is imported for the first time.
+    if not any(isinstance(f, _Finder) for f in sys.meta_path):
+        sys.meta_path.insert(0, _Finder())
+
+
+class _Finder(importlib.abc.MetaPathFinder, importlib.abc.Loader):
+    def find_spec(self, fullname, path, target=None):
+        if fullname != MODULE_NAME:
+            return None
+        return importlib.util.spec_from_loader(fullname, self)
+
+    def create_module(self, spec):
+        return None
+
+    def exec_module(self, module):
+        module.CoordCube = CoordCube
+        module.getPruning = getPruning
+
+
+def getPruning(table, index):
+    """Extract pruning value"""
+    if (index & 1) == 0:
+        return table[index // 2] & 0x0f
+    else:
+        return (table[index // 2] & 0xf0) >> 4
+
+
+def _original_tables():
+    # Runs the original coordcube module (without registering it), which
+    # loads the tables from its pickle cache or generates them.
+    import kociemba.pykociemba
+    spec = importlib.machinery.PathFinder.find_spec(
+        MODULE_NAME, kociemba.pykociemba.__path__)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return {name: getattr(module.CoordCube, name)
+            for name in MOVE_TABLES + PRUNING_TABLES}
+
+
+def _write_tables(path, tables):
+    entries = []
+    blobs = []
+    offset = HEADER.size + ENTRY.size * len(tables)
+    for name, table in tables.items():
+        if name in MOVE_TABLES:
+            rows, cols = len(table), len(table[0])
+            flat = [x for row in table for x in row]
+            typecode = 'h' if max(flat) < 2**15 else 'i'
+            blob = array(typecode, flat).tobytes()
+        else:
+            # The original tables contain negative values in unused bits.
+            rows, cols = len(table), 0
+            typecode = 'B'
+            blob = bytes(x & 0xff for x in table)
+        # Keep all arrays aligned.
+        offset += -offset % 8
+        entries.append(ENTRY.pack(name.encode(), typecode.encode(),
+                                  rows, cols, offset))
+        blobs.append((offset, blob))
+        offset += len(blob)
+
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(FILE_MAGIC, FILE_VERSION,
+                            0 if sys.byteorder == 'little' else 1,
+                            len(entries)))
+        for entry in entries:
+            f.write(entry)
+        for offset, blob in blobs:
+            f.seek(offset)
+            f.write(blob)
+    os.replace(tmp_path, path)
+
+
+def _map_tables(path):
+    with open(path, 'rb') as f:
+        data = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+    magic, version, byteorder, count = HEADER.unpack_from(data, 0)
+    if (magic != FILE_MAGIC or version != FILE_VERSION or
+            byteorder != (0 if sys.byteorder == 'little' else 1)):
+        raise ValueError("Incompatible table file")
+
+    tables = {}
+    for i in range(count):
+        name, typecode, rows, cols, offset = ENTRY.unpack_from(
+            data, HEADER.size + i * ENTRY.size)
+        name = name.rstrip(b'\0').decode()
+        typecode = typecode.decode()
+        itemsize = array(typecode).itemsize
+        size = rows * max(cols, 1) * itemsize
+        if offset + size > len(data):
+            raise ValueError("Truncated table file")
+        table = data[offset:offset + size].cast(typecode)
+        if cols:
+            # The solver indexes move tables with [row][column]. Row views
+            # share memory with the map.
+            table = [table[r * cols:(r + 1) * cols] for r in range(rows)]
+        tables[name] = table
+
+    if set(tables) != set(MOVE_TABLES + PRUNING_TABLES):
+        raise ValueError("Missing tables")
+    return tables
+
+
+def load_tables():
+    path = os.path.join(_directory, FILE_NAME) if _directory else None
+    if path and os.path.exists(path):
+        try:
+            return _map_tables(path)
+        except (OSError, ValueError) as e:
+            print(f"Failed to load solver tables from {path}: {str(e)}")
+
+    tables = _original_tables()
+    if path:
+        print(f"Saving solver tables to {path}")
+        try:
+            os.makedirs(_directory, exist_ok=True)
+            _write_tables(path, tables)
+        except OSError as e:
+            print(f"Failed to save solver tables to {path}: {str(e)}")
+    return tables
+
+
+class _LazyTables(type):
+    # Loads all tables when any of them is accessed for the first time.
+    def __getattr__(cls, name):
+        if name not in MOVE_TABLES + PRUNING_TABLES:
+            raise AttributeError(name)
+        with _load_lock:
+            if name not in cls.__dict__:
+                for table_name, table in load_tables().items():
+                    setattr(cls, table_name, table)
+        return cls.__dict__[name]
+
+
+class CoordCube(metaclass=_LazyTables):
+    """Representation of the cube on the coordinate level"""
+
+    # Same as in kociemba.pykociemba.coordcube.
+    N_TWIST = 2187
+    N_FLIP = 2048
+    N_SLICE1 = 495
+    N_SLICE2 = 24
+    N_PARITY = 2
+    N_URFtoDLF = 20160
+    N_FRtoBR = 11880
+    N_URtoUL = 1320
+    N_UBtoDF = 1320
+    N_URtoDF = 20160
+    N_URFtoDLB = 40320
+    N_URtoBR = 479001600
+    N_MOVE = 18
+
+    parityMove = [
+        [1, 0, 1, 1, 0, 1, 1, 0, 1, 1, 0, 1, 1, 0, 1, 1, 0, 1],
+        [0, 1, 0, 0, 1, 0, 0, 1, 0, 0, 1, 0, 0, 1, 0, 0, 1, 0],
+    ]
+
+    def __init__(self, c):
+        self.twist = c.getTwist()
+        self.flip = c.getFlip()
+        self.parity = c.cornerParity()
+        self.FRtoBR = c.getFRtoBR()
+        self.URFtoDLF = c.getURFtoDLF()
+        self.URtoUL = c.getURtoUL()
+        self.UBtoDF = c.getUBtoDF()
+        self.URtoDF = c.getURtoDF()
+
+    def move(self, m):
+        cls = type(self)
+        self.twist = cls.twistMove[self.twist][m]
+        self.flip = cls.flipMove[self.flip][m]
+        self.parity = cls.parityMove[self.parity][m]
+        self.FRtoBR = cls.FRtoBR_Move[self.FRtoBR][m]
+        self.URFtoDLF = cls.URFtoDLF_Move[self.URFtoDLF][m]
+        self.URtoUL = cls.URtoUL_Move[self.URtoUL][m]
+        self.UBtoDF = cls.UBtoDF_Move[self.UBtoDF][m]
+        if self.URtoUL < 336 and self.UBtoDF < 336:
+            self.URtoDF = cls.MergeURtoULandUBtoDF[self.URtoUL][self.UBtoDF]
@@ -0,0 +1,143 @@
+import time
+
+from array import array
+
+from typing import List, Optional
+
+# Instrumentation of the time it takes from receiving a state packet to
+# showing the new state. Each packet gets a record with a timestamp for each
+# stage of its handling:
+#   ARRIVAL  - the packet was received by the Bluetooth backend
+#   DISPATCH - on_state_updated was dispatched from Kivy's main loop
+#   DECODE   - the cube state was decoded
+#   ANALYZER - the solve analyzer processed the new state
+#   DISPLAY  - the cube display was redrawn with the new state
+# Records are kept in a fixed-size ring buffer. The tracker is disabled by
+# default, and then each hook only checks a flag.
+
+ARRIVAL, DISPATCH, DECODE, ANALYZER, DISPLAY = range(5)
+STAGE_NAMES = ['arrival', 'dispatch', 'decode', 'analyzer', 'display']
+STAGES = len(STAGE_NAMES)
+
+# Upper bounds of histogram bins, in milliseconds.
+HISTOGRAM_BINS = [0.1, 0.2, 0.5, 1, 2, 5, 10, 20, 50, 100, 200, float('inf')]
+
+
+class LatencyTracker:
+    SIZE = 512
+
+    def __init__(self):
+        self.enabled = False
+        # Nanosecond timestamps, STAGES per record. 0 - not reached.
+        self.stamps = array('q', bytes(8 * STAGES * self.SIZE))
+        # Next record to use. Only written from the Bluetooth backend.
+        self.next = 0
+        # Record of the packet being handled by the main loop.
+        self.current = None
+        # Records handled, not yet passed to the cube display.
+        self.unrendered: List[int] = []
+        # Records passed to the cube display, but not yet drawn.
+        self.undisplayed: List[int] = []
+
+    def clear(self):
+        self.stamps = array('q', bytes(8 * STAGES * self.SIZE))
+        self.current = None
+        self.unrendered = []
+        self.undisplayed = []
+
+    # Called by the backend when a packet arrives, with the arrival time from
+    # time.perf_counter_ns(). Returns the record to pass to dispatched().
+    def arrived(self, ts: int) -> Optional[int]:
+        if not self.enabled:
+            return None
+        record = self.next
+        self.next = (record + 1) % self.SIZE
+        base = record * STAGES
+        self.stamps[base:base + STAGES] = array('q', bytes(8 * STAGES))
+        self.stamps[base] = ts
+        return record
+
+    # Called right before on_state_updated is dispatched.
+    def dispatched(self, record: Optional[int]):
+        if record is None:
+            return
+        self.current = record
+        self.stamps[record * STAGES + DISPATCH] = time.perf_counter_ns()
+
+    def mark(self, stage):
+        if self.current is None:
+            return
+        self.stamps[self.current * STAGES + stage] = time.perf_counter_ns()
+
+    # Called when the packet was fully handled by the main loop.
+    def processed(self):
+        if self.current is None:
+            return
+        # The display only gets the latest state once per frame. Without a
+        # display, keep only as many records as the ring buffer holds.
+        if len(self.unrendered) >= self.SIZE:
+            del self.unrendered[0]
+        self.unrendered.append(self.current)
+        self.current = None
+
+    # Called by the cube display when it schedules a redraw with the latest
+    # state, which covers all packets handled since the previous one.
+    def display_pending(self):
+        self.undisplayed += self.unrendered
+        self.unrendered = []
+
+    # Called by the cube display after a redraw. A redraw shows all packets
+    # handled since the previous one.
+    def displayed(self):
+        if not self.undisplayed:
+            return
+        now = time.perf_counter_ns()
+        for record in self.undisplayed:
+            self.stamps[record * STAGES + DISPLAY] = now
+        self.undisplayed = []
+
+    # Latencies of reaching a stage since packet arrival, in milliseconds.
+    def get_latencies(self, stage) -> List[float]:
+        stamps = self.stamps
+        return [(stamps[base + stage] - stamps[base]) / 1e6
+                for base in range(0, len(stamps), STAGES)
+                if stamps[base] and stamps[base + stage]]
+
+    def get_histogram(self, stage) -> List[int]:
+        counts = [0] * len(HISTOGRAM_BINS)
+        for latency in self.get_latencies(stage):
+            counts[next(i for i, bound in enumerate(HISTOGRAM_BINS)
+                        if latency <= bound)] += 1
+        return counts
+
+    def get_summary(self) -> str:
+        lines = [f"{'stage':<9}{'n':>5}{'p50':>8}{'p95':>8}{'max':>8}  (ms)"]
+        for stage in range(DISPATCH, STAGES):
+            latencies = sorted(self.get_latencies(stage))
+            if not latencies:
+                continue
+            n = len(latencies)
+            lines.append(f"{STAGE_NAMES[stage]:<9}{n:>5}"
+                         f"{latencies[n // 2]:>8.2f}"
+                         f"{latencies[min(n * 95 // 100, n - 1)]:>8.2f}"
+                         f"{latencies[-1]:>8.2f}")
+        return "\n".join(lines)
+
+    # Writes histograms and raw records to a file.
+    def dump(self, path):
+        with open(path, 'w') as f:
+            f.write(self.get_summary() + "\n\n")
+            bins = ' '.join(f"{b:>6}" for b in HISTOGRAM_BINS)
+            f.write(f"{'<= ms':<9}{bins}\n")
+            for stage in range(DISPATCH, STAGES):
+                counts = ' '.join(
+                    f"{c:>6}" for c in self.get_histogram(stage))
+                f.write(f"{STAGE_NAMES[stage]:<9}{counts}\n")
+            f.write("\n" + ",".join(STAGE_NAMES) + "\n")
+            for base in range(0, len(self.stamps), STAGES):
+                if self.stamps[base]:
+                    f.write(",".join(str(self.stamps[base + s])
+                                     for s in range(STAGES)) + "\n")
+
+
+tracker = LatencyTracker()
@@ -1,5 +1,6 @@
 import os
 import kivy
+import datetime
 
 from kivy.app import App
 from kivy.clock import Clock
@@ -7,16 +8,20 @@ from kivy.factory import Factory
 from kivy.metrics import Metrics
 from kivy.core.window import Window
 
-import kociemba
-
 from bluetoothcube.btutil import (
     BluetoothCubeScanner, BluetoothCubeConnection)
+from bluetoothcube.btutil.capture import PacketRecorder, ReplayConnection
+from bluetoothcube.btutil.simulated import (
+    SimulatedCubeScanner, SimulatedCubeConnection)
 
 from bluetoothcube.bluetoothcube import BluetoothCube, ScrambleDetector
 from bluetoothcube.ui import CubeButton, BluetoothCubeRoot
 from bluetoothcube.timer import Timer
 from bluetoothcube.timehistory import TimeHistory
 from bluetoothcube.solveanalyzers import Analyzer
+from bluetoothcube.solver import Solver
+from bluetoothcube import kociembatables
+from bluetoothcube import latency
 
 
 if kivy.platform == "linux":
@@ -33,6 +38,25 @@ if kivy.platform == "linux":
 
 class BluetoothCubeApp(App):
     cubelist = kivy.properties.ObjectProperty(None)
+    # Keep time history in an SQLite database instead of times.txt.
+    use_database = kivy.properties.BooleanProperty(False)
+    # Keep time history in the columnar binary format (times.bin) instead of
+    # times.txt.
+    binary_history = kivy.properties.BooleanProperty(False)
+    # Write all packets received from the cube to a file in captures/.
+    capture_packets = kivy.properties.BooleanProperty(False)
+    # Replay a capture file instead of scanning for cubes.
+    replay_path = kivy.properties.StringProperty(None, allownone=True)
+    replay_realtime = kivy.properties.BooleanProperty(True)
+    # When non-zero, connect to a simulated cube turning at this rate (turns
+    # per second) instead of scanning for real cubes.
+    simulate_tps = kivy.properties.NumericProperty(0)
+    simulate_encrypted = kivy.properties.BooleanProperty(False)
+    # Measure packet handling latency and show it in an overlay. F12 dumps
+    # the measurements to a file.
+    show_latency = kivy.properties.BooleanProperty(False)
+    # Stream all moves made on the cube to a rotating log in moves/.
+    log_moves = kivy.properties.BooleanProperty(False)
 
     def __init__(self):
         super(BluetoothCubeApp, self).__init__()
@@ -49,12 +73,11 @@ class BluetoothCubeApp(App):
                     width, height = width * 2, height * 2
                 Window.size = (width, height)
 
-        self.cube_scanner = BluetoothCubeScanner()
-        self.cube_scanner.bind(
-            on_cube_found=self.on_cube_found,
-            on_paired_cube_found=self.on_paired_cube_found)
+        # Created on first scan, once it is known whether to simulate a cube.
+        self.cube_scanner = None
 
         self.cube_connection = None
+        self.packet_recorder = None
 
         self.cube = BluetoothCube()
 
@@ -73,21 +96,83 @@ class BluetoothCubeApp(App):
         self.analyzer = Analyzer(self.cube, self.timer)
         self.timer.use_analyzer(self.analyzer)
 
+        kociembatables.use_directory(self.user_data_dir)
+        self.solver = Solver()
+        self.solver.bind(
+            on_solution=self.on_solution,
+            on_solve_failed=self.on_solve_failed,
+            on_solve_cancelled=self.on_solve_cancelled)
+        self.solution_popup = None
+        # A solution is no longer valid once the cube moves.
+        self.cube.bind(on_state_changed=lambda c, s: self.solver.cancel())
+        self.solver.warm_up()
+
         # When the app starts, start a scan.
         Clock.schedule_once(lambda td: self.start_scan(), 1)
 
         # When the app starts, load time history from file.
-        Clock.schedule_once(
-            lambda td:
-            self.timehistory.use_file(
-                os.path.join(self.user_data_dir, "times.txt")), 1)
+        Clock.schedule_once(lambda td: self.load_times(), 1)
+
+    def load_times(self):
+        times_path = os.path.join(self.user_data_dir, "times.txt")
+        if self.use_database:
+            self.timehistory.use_database(
+                os.path.join(self.user_data_dir, "times.db"),
+                import_path=times_path)
+        elif self.binary_history:
+            self.timehistory.use_binary_file(
+                os.path.join(self.user_data_dir, "times.bin"),
+                import_path=times_path)
+        else:
+            self.timehistory.use_file(times_path)
 
     def build(self):
         return BluetoothCubeRoot()
 
+    def on_start(self):
+        if self.show_latency:
+            self.start_latency_tracking()
+        if self.log_moves:
+            self.start_move_log()
+
+    def start_move_log(self):
+        self.cube.use_move_log(os.path.join(self.user_data_dir, "moves"))
+        Clock.schedule_interval(lambda td: self.cube.flush_move_log(), 5)
+
+    def start_latency_tracking(self):
+        latency.tracker.enabled = True
+        self.latency_overlay = Factory.LatencyOverlay()
+        Window.add_widget(self.latency_overlay)
+        Clock.schedule_interval(
+            lambda td: self.update_latency_overlay(), 1)
+        Window.bind(on_key_down=self.on_key_down)
+
+    def update_latency_overlay(self):
+        self.latency_overlay.text = latency.tracker.get_summary()
+
+    def dump_latency(self):
+        path = os.path.join(self.user_data_dir, datetime.datetime.now(
+            ).strftime("latency-%Y%m%d-%H%M%S.txt"))
+        try:
+            latency.tracker.dump(path)
+        except OSError as e:
+            print(f"Failed to dump latency measurements: {str(e)}")
+            return
+        print(latency.tracker.get_summary())
+        print(f"Latency measurements written to {path}")
+
+    def on_key_down(self, window, key, scancode, codepoint, modifiers):
+        if key == 293:  # F12
+            self.dump_latency()
+            return True
+
     def on_stop(self):
         # Save time history.
         self.timehistory.persist()
+        self.stop_capture()
+        self.cube.close_move_log()
+        if latency.tracker.enabled:
+            self.dump_latency()
 
         # Make sure to disassociate the cube when closing the app.
         # Otherwise other devices won't connect.
@@ -96,8 +181,22 @@ class BluetoothCubeApp(App):
             self.cube_connection.disconnect()
 
     def start_scan(self):
+        if self.replay_path:
+            # Replay only once, scan for real cubes after disconnecting.
+            path, self.replay_path = self.replay_path, None
+            self.start_connection(ReplayConnection(
+                path, self.replay_realtime))
+            return
+
         print("Starting a scan...")
 
+        if not self.cube_scanner:
+            self.cube_scanner = (SimulatedCubeScanner() if self.simulate_tps
+                                 else BluetoothCubeScanner())
+            self.cube_scanner.bind(
+                on_cube_found=self.on_cube_found,
+                on_paired_cube_found=self.on_paired_cube_found)
+
         for button in self.cube_buttons:
             self.root.cubelist.remove_widget(button)
         self.cube_buttons = []
@@ -127,7 +226,13 @@ class BluetoothCubeApp(App):
         print("Connecting to a cube...")
 
         self.cube_scanner.stop_scan()
+        if self.simulate_tps:
+            self.start_connection(SimulatedCubeConnection(
+                deviceinfo, self.simulate_tps, self.simulate_encrypted))
+        else:
+            self.start_connection(BluetoothCubeConnection(deviceinfo))
 
+    def start_connection(self, connection):
         self.root.transition.direction = 'left'
         self.root.current = 'connecting'
 
@@ -139,7 +244,7 @@ class BluetoothCubeApp(App):
             lambda td:
             self.root.connecting_cancelbutton.show(), 10)
 
-        self.cube_connection = BluetoothCubeConnection(deviceinfo)
+        self.cube_connection = connection
         self.cube_connection.bind(
             on_cube_connecting=self.on_cube_connecting,
             on_cube_connecting_failed=self.on_cube_connecting_failed,
@@ -169,12 +274,32 @@ class BluetoothCubeApp(App):
     def on_cube_ready(self, cube_connection):
         print("Cube ready!")
         self.cube.set_connection(self.cube_connection)
+        if self.capture_packets:
+            self.start_capture()
 
         self.root.disconnectbutton.text = "Disconnect cube"
         self.root.transition.direction = 'left'
         self.root.current = 'timer'
 
+    def start_capture(self):
+        directory = os.path.join(self.user_data_dir, "captures")
+        path = os.path.join(directory, datetime.datetime.now().strftime(
+            "%Y%m%d-%H%M%S.bcpk"))
+        try:
+            os.makedirs(directory, exist_ok=True)
+            self.packet_recorder = PacketRecorder(self.cube_connection, path)
+        except OSError as e:
+            print(f"Failed to start packet capture: {str(e)}")
+            return
+        print(f"Capturing packets to {path}")
+
+    def stop_capture(self):
+        if self.packet_recorder:
+            self.packet_recorder.close()
+            self.packet_recorder = None
+
     def on_cube_disconnected(self, connection):
+        self.stop_capture()
         self.goto_cube_selection()
         self.start_scan()
 
@@ -204,22 +329,30 @@ class BluetoothCubeApp(App):
             self.cube_connection.reset_cube()
 
     def solve(self):
-        cube_str = self.cube.cube_state.toFaceCube().to_String()
+        self.solution_popup = Factory.SolutionPopup()
+        self.solution_popup.open()
 
         if self.cube.cube_state.is_solved():
-            solution = "Cube is already solved!"
+            self.show_solution("Cube is already solved!")
         else:
-            try:
-                print("Solving...")
-                solution = kociemba.solve(cube_str)
-                print(f"Solution: {solution}")
-            except ValueError as e:
-                print(f"Failed to solve the cube: {str(e)}")
-                return
-
-        solution_popup = Factory.SolutionPopup()
-        solution_popup.ids["solution_label"].text = solution
-        solution_popup.open()
+            print("Solving...")
+            self.show_solution("Solving...")
+            self.solver.solve(self.cube.cube_state)
+
+    def show_solution(self, text):
+        if self.solution_popup:
+            self.solution_popup.ids["solution_label"].text = text
+
+    def on_solution(self, solver, solution):
+        print(f"Solution: {solution}")
+        self.show_solution(solution)
+
+    def on_solve_failed(self, solver, message):
+        print(f"Failed to solve the cube: {message}")
+        self.show_solution(f"Failed to solve the cube: {message}")
+
+    def on_solve_cancelled(self, solver):
+        self.show_solution("The cube has moved.")
 
     def autoprime(self):
         if not self.timer.running and not self.timer.primed:
@@ -0,0 +1,160 @@
+import os
+import struct
+
+from array import array
+
+from bluetoothcube.utils import TIMESTAMPED_HEADER, epoch_microseconds
+
+from typing import Iterator, List, Optional, Tuple
+
+# Compact storage of cube moves, so that memory use does not grow over long
+# sessions.
+#
+# Each move is encoded in a single byte (see Move.code), together with the
+# time since the previous move in microseconds. Recent moves are kept in
+# memory in fixed-size ring buffers. All raw moves can additionally be
+# streamed to a log on disk, which is rotated once it gets too big.
+
+# Longest time between moves that can be stored, about 71 minutes.
+MAX_DELTA = 2**32 - 1
+
+
+class MoveRing:
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.codes = bytearray(capacity)
+        self.deltas = array('I', bytes(4 * capacity))
+        # Number of moves ever appended. The newest move is at
+        # (end - 1) % capacity.
+        self.end = 0
+        # Arrival time (from time.perf_counter_ns()) of the newest move.
+        self.last_ts: Optional[int] = None
+
+    def __len__(self):
+        return min(self.end, self.capacity)
+
+    # Appends a move, overwriting the oldest one when full. Returns the
+    # stored time since the previous move.
+    def append(self, code: int, ts: int) -> int:
+        if self.last_ts is None:
+            delta = 0
+        else:
+            delta = min(max((ts - self.last_ts) // 1000, 0), MAX_DELTA)
+        i = self.end % self.capacity
+        self.codes[i] = code
+        self.deltas[i] = delta
+        self.end += 1
+        self.last_ts = ts
+        return delta
+
+    # Replaces the newest move, e.g. when merging it with the next one.
+    def replace_last(self, code: int):
+        self.codes[(self.end - 1) % self.capacity] = code
+
+    # Index 0 is the oldest remembered move, -1 the newest.
+    def __getitem__(self, index: int) -> int:
+        length = len(self)
+        if index < 0:
+            index += length
+        if not 0 <= index < length:
+            raise IndexError("move index out of range")
+        return self.codes[(self.end - length + index) % self.capacity]
+
+    # Codes and deltas of the last n moves (all remembered moves if n is
+    # None), oldest first.
+    def last(self, n: Optional[int] = None) -> List[Tuple[int, int]]:
+        length = len(self)
+        n = length if n is None else min(n, length)
+        start = (self.end - n) % self.capacity
+        indices = [(start + i) % self.capacity for i in range(n)]
+        return [(self.codes[i], self.deltas[i]) for i in indices]
+
+    def clear(self):
+        self.end = 0
+        self.last_ts = None
+
+
+# A move log file starts with a header, followed by a record per move: the
+# move code and the time since the previous move. The first record of each
+# file has no previous move, and is stored with a delta of 0.
+
+FILE_MAGIC = b'BCML'
+FILE_VERSION = 1
+
+# The header (TIMESTAMPED_HEADER) holds the wall-clock time of the first
+# move in the file.
+# Move code, microseconds since the previous move.
+RECORD = struct.Struct('<BI')
+
+
+# Yields the code of each move in a log file, and its wall-clock time in
+# microseconds since epoch (UTC).
+def read_move_log(path) -> Iterator[Tuple[int, int]]:
+    with open(path, 'rb') as f:
+        data = f.read()
+    magic, version, ts = TIMESTAMPED_HEADER.unpack_from(data)
+    if magic != FILE_MAGIC or version != FILE_VERSION:
+        raise ValueError(f"{path} is not a compatible move log")
+    offset = TIMESTAMPED_HEADER.size
+    # A truncated last record is ignored.
+    while offset + RECORD.size <= len(data):
+        code, delta = RECORD.unpack_from(data, offset)
+        offset += RECORD.size
+        ts += delta
+        yield code, ts
+
+
+# Writes moves to moves.bcml in the given directory. When the file grows
+# over max_bytes, or when a new log is started, the file is renamed to
+# moves.1.bcml (moves.1.bcml to moves.2.bcml, and so on). At most `backups`
+# old files are kept.
+class MoveLogWriter:
+    MAX_BYTES = 1024 * 1024
+    BACKUPS = 3
+
+    def __init__(self, directory, max_bytes=MAX_BYTES, backups=BACKUPS):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.file = None
+        self.size = 0
+
+    def get_path(self, backup=0):
+        name = "moves.bcml" if backup == 0 else f"moves.{backup}.bcml"
+        return os.path.join(self.directory, name)
+
+    def open(self):
+        os.makedirs(self.directory, exist_ok=True)
+        if os.path.exists(self.get_path()):
+            self.rotate()
+        self.file = open(self.get_path(), 'wb')
+        self.file.write(TIMESTAMPED_HEADER.pack(
+            FILE_MAGIC, FILE_VERSION, epoch_microseconds()))
+        self.size = TIMESTAMPED_HEADER.size
+
+    def rotate(self):
+        self.close()
+        for backup in range(self.backups, 0, -1):
+            source = self.get_path(backup - 1)
+            if os.path.exists(source):
+                os.replace(source, self.get_path(backup))
+
+    def write(self, code: int, delta: int):
+        if self.file and self.size >= self.max_bytes:
+            self.rotate()
+        if not self.file:
+            self.open()
+            delta = 0
+        self.file.write(RECORD.pack(code, delta))
+        self.size += RECORD.size
+
+    # Records are buffered, call this periodically so that a crash does not
+    # lose many moves.
+    def flush(self):
+        if self.file:
+            self.file.flush()
+
+    def close(self):
+        if self.file:
+            self.file.close()
+            self.file = None
@@ -1,8 +1,6 @@
 import re
 
-from bluetoothcube.cubestate import FaceCube
-
-from typing import List
+from bluetoothcube.cubestate import FaceCube, PatternSet
 
 
 # TODO: These functions deserve some unit tests.
@@ -16,10 +14,10 @@ def compile_pattern(s):
                     faces['D'] + faces['L'] + faces['B'])
 
 
-def generate_variants_from_f(pattern: FaceCube) -> List[FaceCube]:
-    return [pattern, pattern.rotated("x").rotated("x"),
-            pattern.rotated("x"), pattern.rotated("x'"),
-            pattern.rotated("y"), pattern.rotated("y'")]
+def generate_variants_from_f(pattern: FaceCube) -> PatternSet:
+    return PatternSet([pattern, pattern.rotated("x").rotated("x"),
+                       pattern.rotated("x"), pattern.rotated("x'"),
+                       pattern.rotated("y"), pattern.rotated("y'")])
 
 
 GENERIC = [
@@ -106,7 +104,7 @@ L L . F F F . R R B B B
       D D D
 """))
 
-CFOP_PLL = [compile_pattern("""
+CFOP_PLL = PatternSet([compile_pattern("""
       U U U
       U U U
       U U U
@@ -116,4 +114,4 @@ L L L F F F R R R B B B
       D D D
       D D D
       D D D
-""")]
+""")])
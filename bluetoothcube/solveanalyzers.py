@@ -1,5 +1,6 @@
 import kivy
 
+from bluetoothcube import latency
 from bluetoothcube.patterns import (
     CFOP_CROSS, CFOP_F2L, CFOP_OLL, CFOP_PLL)
 
@@ -59,11 +60,11 @@ class Analyzer(kivy.event.EventDispatcher):
         self.detect_stage_changes()
 
     def on_state_changed(self, cube, newstate):
-        if not self.timer.running:
-            # Do not track state changes whilst the timer is stopped. We're not
-            # interested in these.
-            return
-        self.detect_stage_changes()
+        # Do not track state changes whilst the timer is stopped. We're not
+        # interested in these.
+        if self.timer.running:
+            self.detect_stage_changes()
+        latency.tracker.mark(latency.ANALYZER)
 
     def detect_stage_changes(self):
         # Advance to next state if target condition is met.
@@ -71,8 +72,8 @@ class Analyzer(kivy.event.EventDispatcher):
         if not target_pattern:
             return
 
-        if self.cube.cube_state.toFaceCube().matches_any(target_pattern):
-            current_time = self.timer.get_time()
+        if self.cube.cube_state.matches_any(target_pattern):
+            current_time = self.get_stage_end_time()
             stage_time = current_time - self.stage_start_time
             # print(f"{stage_name} completed in {stage_time:.02f}.")
 
@@ -84,6 +85,15 @@ class Analyzer(kivy.event.EventDispatcher):
             # Retry - maybe we've advanced more than one stage in one turn?
             self.detect_stage_changes()
 
+    # Stages end when the packet arrived, not when it is handled. A timer
+    # started manually may start after the last packet arrived, and then
+    # stages that are already complete end at the start of the solve.
+    def get_stage_end_time(self) -> float:
+        ts = self.cube.last_update_ts
+        if ts is None or ts < self.timer.start_time:
+            return self.timer.get_time()
+        return self.timer.get_time(ts)
+
     def on_solve_ended(self, timer):
         stage_name, _ = self.stages[self.current_stage]
         if stage_name != 'DONE':
@@ -0,0 +1,114 @@
+import kivy
+import queue
+
+from collections import OrderedDict
+from threading import Thread
+
+from kivy.clock import Clock
+
+from bluetoothcube.cubestate import CubieCube
+
+
+class SolveRequest:
+    def __init__(self, key, cube_str):
+        self.key = key
+        self.cube_str = cube_str
+        self.cancelled = False
+        self.solution = None
+        self.error = None
+
+
+# Runs the Kociemba solver in a background thread so that the UI does not
+# freeze while a solution is searched for. Solutions are cached by cube state.
+class Solver(kivy.event.EventDispatcher):
+    CACHE_SIZE = 100
+
+    def __init__(self):
+        self.register_event_type('on_solution')
+        self.register_event_type('on_solve_failed')
+        self.register_event_type('on_solve_cancelled')
+        super().__init__()
+
+        self.cache: OrderedDict = OrderedDict()
+        self.pending = None
+        self.requests: queue.Queue = queue.Queue()
+
+        # A daemon thread, so that a long search does not prevent the app
+        # from exiting.
+        Thread(target=self.worker, daemon=True).start()
+
+    def worker(self):
+        while True:
+            request = self.requests.get()
+            if request.cancelled:
+                continue
+            try:
+                # Imported here, because importing kociemba may load its
+                # pruning tables, and we do not want to do that in the main
+                # thread.
+                import kociemba
+                request.solution = kociemba.solve(request.cube_str)
+            except Exception as e:
+                # Any failure is reported, so that this thread keeps running
+                # and nobody waits for the solution forever.
+                request.error = str(e) or type(e).__name__
+            # Results are delivered in the main thread.
+            Clock.schedule_once(lambda td, r=request: self.on_done(r))
+
+    def warm_up(self):
+        # The first solve is slow, because solver tables need to be loaded or
+        # even generated. Do it in the background before the user asks.
+        cube = CubieCube()
+        cube.apply_move(0)
+        self.requests.put(SolveRequest(None, cube.toFaceCube().to_String()))
+
+    def solve(self, cube_state: CubieCube):
+        # The previous request is replaced, not cancelled by the user.
+        self.cancel(notify=False)
+
+        key = cube_state.key()
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            self.dispatch('on_solution', self.cache[key])
+            return
+
+        self.pending = SolveRequest(key, cube_state.toFaceCube().to_String())
+        self.requests.put(self.pending)
+
+    # Stops waiting for the current solution, e.g. because the cube has moved.
+    def cancel(self, notify=True):
+        if not self.pending:
+            return
+        self.pending.cancelled = True
+        self.pending = None
+        if notify:
+            self.dispatch('on_solve_cancelled')
+
+    def on_done(self, request):
+        if request.key is None:
+            return  # Warm-up request
+
+        if request.error:
+            if request is self.pending:
+                self.pending = None
+                self.dispatch('on_solve_failed', request.error)
+            return
+
+        # Cache the solution even if nobody waits for it anymore, the cube may
+        # return to this state.
+        self.cache[request.key] = request.solution
+        if len(self.cache) > self.CACHE_SIZE:
+            self.cache.popitem(last=False)
+
+        if request is self.pending:
+            self.pending = None
+            self.dispatch('on_solution', request.solution)
+
+    def on_solution(self, *args):
+        pass
+
+    def on_solve_failed(self, *args):
+        pass
+
+    def on_solve_cancelled(self, *args):
+        pass
@@ -0,0 +1,191 @@
+import json
+import sqlite3
+import datetime
+
+from bluetoothcube.common import Time
+
+from typing import Dict, List, Optional, Tuple
+
+# An optional SQLite backend for time history. Sessions, solves and the time
+# of each solve stage are kept in indexed tables, so that queries over the
+# whole history (by date, best times, stage statistics) run in the database
+# instead of scanning all solves in Python.
+#
+# TimeHistory only ever changes the last solve of the current session, so
+# the store tracks row ids of the session's solves as a stack. Changes are
+# queued with record() and written in a single transaction by flush().
+
+SCHEMA_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    created TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS solves (
+    id INTEGER PRIMARY KEY,
+    session_id INTEGER NOT NULL REFERENCES sessions(id) ON DELETE CASCADE,
+    ts TEXT NOT NULL,
+    time REAL,
+    dnf INTEGER NOT NULL,
+    p2 INTEGER NOT NULL,
+    meta TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS stage_times (
+    solve_id INTEGER NOT NULL REFERENCES solves(id) ON DELETE CASCADE,
+    stage TEXT NOT NULL,
+    time REAL NOT NULL,
+    PRIMARY KEY (solve_id, stage)
+);
+CREATE INDEX IF NOT EXISTS solves_session_ts ON solves(session_id, ts);
+CREATE INDEX IF NOT EXISTS solves_session_time
+    ON solves(session_id, time) WHERE dnf = 0;
+CREATE INDEX IF NOT EXISTS stage_times_stage ON stage_times(stage, time);
+"""
+
+SOLVE_COLUMNS = "solves.ts, solves.time, solves.dnf, solves.p2, solves.meta"
+
+
+def _solve_row(session_id, t: Time):
+    # Timestamps are ISO strings, which sort chronologically.
+    return (session_id, t.ts.isoformat(), t.time, int(t.is_dnf()),
+            int(t.is_p2()), json.dumps(t.meta))
+
+
+def _stage_rows(solve_id, t: Time):
+    return [(solve_id, name, stage_time)
+            for name, stage_time in (t.meta or {}).get('stage_times', [])]
+
+
+def _to_time(row) -> Time:
+    ts, time, dnf, p2, meta = row
+    return Time.from_fields(ts, time, bool(dnf), bool(p2), meta)
+
+
+class SQLiteStore:
+    def __init__(self, path):
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA foreign_keys = ON")
+        version, = self.db.execute("PRAGMA user_version").fetchone()
+        if version > SCHEMA_VERSION:
+            raise ValueError(f"{path} was created by a newer version")
+        with self.db:
+            self.db.executescript(SCHEMA)
+            self.db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+        # Changes not yet written to the database, as (op, time) pairs with
+        # the same operations as the time history journal.
+        self.pending: List[Tuple[str, Time]] = []
+        # Row ids of the current session's solves, in order.
+        self.ids: List[int] = []
+
+        row = self.db.execute(
+            "SELECT id FROM sessions ORDER BY id DESC LIMIT 1").fetchone()
+        self.session_id = row[0] if row else self.new_session("Default")
+
+    def close(self):
+        self.flush()
+        self.db.close()
+
+    def new_session(self, name) -> int:
+        self.flush()
+        with self.db:
+            cursor = self.db.execute(
+                "INSERT INTO sessions (name, created) VALUES (?, ?)",
+                (name, datetime.datetime.utcnow().isoformat()))
+        self.session_id = cursor.lastrowid
+        self.ids = []
+        return self.session_id
+
+    def get_sessions(self) -> List[Tuple[int, str]]:
+        return self.db.execute(
+            "SELECT id, name FROM sessions ORDER BY id").fetchall()
+
+    def is_empty(self) -> bool:
+        return self.db.execute(
+            "SELECT NOT EXISTS (SELECT 1 FROM solves)").fetchone()[0] == 1
+
+    # Loads all solves of the current session.
+    def load_session(self) -> List[Time]:
+        self.flush()
+        rows = self.db.execute(
+            f"SELECT solves.id, {SOLVE_COLUMNS} FROM solves "
+            "WHERE session_id = ? ORDER BY id",
+            (self.session_id,)).fetchall()
+        self.ids = [row[0] for row in rows]
+        return [_to_time(row[1:]) for row in rows]
+
+    # Appends many solves to the current session in one transaction.
+    def import_times(self, times: List[Time]):
+        self.flush()
+        with self.db:
+            for t in times:
+                self._insert(t)
+
+    # Must be called within a transaction.
+    def _insert(self, t: Time):
+        cursor = self.db.execute(
+            "INSERT INTO solves (session_id, ts, time, dnf, p2, meta) "
+            "VALUES (?, ?, ?, ?, ?, ?)", _solve_row(self.session_id, t))
+        self.ids.append(cursor.lastrowid)
+        self.db.executemany("INSERT INTO stage_times VALUES (?, ?, ?)",
+                            _stage_rows(cursor.lastrowid, t))
+
+    #   A - time was added at the end of the session
+    #   E - last time was edited
+    #   D - last time was deleted
+    def record(self, op, time: Time):
+        self.pending.append((op, time))
+
+    def flush(self):
+        if not self.pending:
+            return
+        pending, self.pending = self.pending, []
+        with self.db:
+            for op, t in pending:
+                if op == 'A':
+                    self._insert(t)
+                elif op == 'E':
+                    self.db.execute(
+                        "UPDATE solves SET time = ?, dnf = ?, p2 = ? "
+                        "WHERE id = ?",
+                        (t.time, int(t.is_dnf()), int(t.is_p2()),
+                         self.ids[-1]))
+                elif op == 'D':
+                    self.db.execute("DELETE FROM solves WHERE id = ?",
+                                    (self.ids.pop(),))
+
+    def get_solves_between(self, start: datetime.datetime,
+                           end: datetime.datetime,
+                           session_id: Optional[int] = None) -> List[Time]:
+        self.flush()
+        rows = self.db.execute(
+            f"SELECT {SOLVE_COLUMNS} FROM solves "
+            "WHERE session_id = ? AND ts >= ? AND ts < ? ORDER BY ts",
+            (session_id or self.session_id, start.isoformat(),
+             end.isoformat())).fetchall()
+        return [_to_time(row) for row in rows]
+
+    def get_best_solves(self, n=1,
+                        session_id: Optional[int] = None) -> List[Time]:
+        self.flush()
+        rows = self.db.execute(
+            f"SELECT {SOLVE_COLUMNS} FROM solves "
+            "WHERE session_id = ? AND dnf = 0 ORDER BY time LIMIT ?",
+            (session_id or self.session_id, n)).fetchall()
+        return [_to_time(row) for row in rows]
+
+    # Returns stage name -> (number of solves, mean time, best time).
+    def get_stage_stats(self, session_id: Optional[int] = None
+                        ) -> Dict[str, Tuple[int, float, float]]:
+        self.flush()
+        rows = self.db.execute(
+            "SELECT stage, COUNT(*), AVG(stage_times.time), "
+            "MIN(stage_times.time) FROM stage_times "
+            "JOIN solves ON solves.id = stage_times.solve_id "
+            "WHERE session_id = ? AND dnf = 0 GROUP BY stage",
+            (session_id or self.session_id,)).fetchall()
+        return {stage: (count, mean, best)
+                for stage, count, mean, best in rows}
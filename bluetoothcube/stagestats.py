@@ -0,0 +1,145 @@
+import math
+import bisect
+import itertools
+
+from array import array
+
+from bluetoothcube.common import Time
+
+from typing import Dict, List, Optional
+
+# Statistics of solve stage times (e.g. CROSS/F2L/OLL/PLL splits recorded by
+# the analyzer) over the whole time history.
+#
+# Each stage's times are kept in a compact array together with prefix sums,
+# so that means, rolling averages and trends over any range are computed
+# from a few array lookups instead of a pass over the solves. Times are also
+# kept sorted for percentiles. Everything is updated incrementally as solves
+# are added to or removed from the end of the history.
+
+
+# Yields start + values[0], start + values[0] + values[1], ...
+def _running_sum(start, values):
+    return itertools.islice(
+        itertools.accumulate(itertools.chain((start,), values)), 1, None)
+
+
+class StageSeries:
+    def __init__(self):
+        # Index of the solve in the history, for each recorded stage time.
+        self.solves = array('l')
+        self.values = array('d')
+        # prefix[k] = sum of values[:k]
+        self.prefix = array('d', [0.0])
+        # weighted[k] = sum of j * values[j] for j < k, for trends.
+        self.weighted = array('d', [0.0])
+        self.sorted: List[float] = []
+
+    def __len__(self):
+        return len(self.values)
+
+    def append(self, solve: int, value: float):
+        k = len(self.values)
+        self.solves.append(solve)
+        self.values.append(value)
+        self.prefix.append(self.prefix[-1] + value)
+        self.weighted.append(self.weighted[-1] + k * value)
+        bisect.insort(self.sorted, value)
+
+    # Appends many times at once, much faster than append() in a loop.
+    def extend(self, solves: List[int], values: List[float]):
+        k = len(self.values)
+        self.solves.extend(solves)
+        self.values.extend(values)
+        self.prefix.extend(_running_sum(self.prefix[-1], values))
+        self.weighted.extend(_running_sum(
+            self.weighted[-1], ((k + j) * v for j, v in enumerate(values))))
+        self.sorted = sorted(self.sorted + list(values))
+
+    def pop(self):
+        self.solves.pop()
+        value = self.values.pop()
+        self.prefix.pop()
+        self.weighted.pop()
+        del self.sorted[bisect.bisect_left(self.sorted, value)]
+
+    # Mean of the last n times (all times if n is None).
+    def mean(self, n: Optional[int] = None) -> Optional[float]:
+        k = len(self.values)
+        n = k if n is None else min(n, k)
+        if n == 0:
+            return None
+        return (self.prefix[k] - self.prefix[k - n]) / n
+
+    # Percentile (0-100) of all times, interpolating between closest ranks.
+    def percentile(self, p: float) -> Optional[float]:
+        if not self.sorted:
+            return None
+        pos = (len(self.sorted) - 1) * p / 100
+        lo = math.floor(pos)
+        hi = min(lo + 1, len(self.sorted) - 1)
+        return self.sorted[lo] + (self.sorted[hi] - self.sorted[lo]) * (
+            pos - lo)
+
+    # Means of every n consecutive times, in order.
+    def rolling_means(self, n: int) -> array:
+        prefix = self.prefix
+        return array('d', ((prefix[k] - prefix[k - n]) / n
+                           for k in range(n, len(prefix))))
+
+    # Slope of the least squares line through the last n times (all times if
+    # n is None), in seconds per solve. Negative when getting faster.
+    def trend(self, n: Optional[int] = None) -> Optional[float]:
+        k = len(self.values)
+        n = k if n is None else min(n, k)
+        if n < 2:
+            return None
+        start = k - n
+        # Positions are shifted to 0..n-1 within the range.
+        sum_y = self.prefix[k] - self.prefix[start]
+        sum_xy = self.weighted[k] - self.weighted[start] - start * sum_y
+        sum_x = n * (n - 1) / 2
+        sum_xx = (n - 1) * n * (2 * n - 1) / 6
+        return (n * sum_xy - sum_x * sum_y) / (n * sum_xx - sum_x * sum_x)
+
+
+class StageStats:
+    def __init__(self):
+        self.stages: Dict[str, StageSeries] = {}
+        self.count = 0
+
+    def rebuild(self, data: List[Time]):
+        columns: Dict[str, tuple] = {}
+        for i, time in enumerate(data):
+            meta = time.meta
+            for name, stage_time in (meta or {}).get('stage_times', []):
+                if name not in columns:
+                    columns[name] = ([], [])
+                columns[name][0].append(i)
+                columns[name][1].append(stage_time)
+        self.stages = {}
+        for name, (solves, values) in columns.items():
+            self.stages[name] = StageSeries()
+            self.stages[name].extend(solves, values)
+        self.count = len(data)
+
+    def push(self, time: Time):
+        meta = time.meta
+        for name, stage_time in (meta or {}).get('stage_times', []):
+            if name not in self.stages:
+                self.stages[name] = StageSeries()
+            self.stages[name].append(self.count, stage_time)
+        self.count += 1
+
+    # Removes the last solve.
+    def pop(self):
+        self.count -= 1
+        for series in self.stages.values():
+            if series.solves and series.solves[-1] == self.count:
+                series.pop()
+
+    def __getitem__(self, stage) -> StageSeries:
+        return self.stages[stage]
+
+    def __contains__(self, stage):
+        return stage in self.stages
@@ -1,12 +1,160 @@
 import os
 import kivy
+import shutil
+import math
+import bisect
 
 from kivy.factory import Factory
 from kivy.clock import Clock
 
 from bluetoothcube.common import Time
+from bluetoothcube.historystore import HistoryColumns
+from bluetoothcube.stagestats import StageStats
 
-from typing import Optional
+from typing import Dict, List, Optional, Tuple
+
+
+# Average of the last N times using competition rules, updated incrementally
+# as times enter and leave the window. Keeps the window's non-DNF times
+# sorted, their sum, and the number of DNFs.
+class RollingAverage:
+    def __init__(self, n: int):
+        # With the best and worst times discarded, nothing would be left.
+        if n < 3:
+            raise ValueError(f"Average of {n} is not defined, N must be at "
+                             "least 3")
+        self.n = n
+        self.count = 0
+        self.dnfs = 0
+        self.sum = 0.0
+        self.sorted: List[float] = []
+
+    def add(self, time: Time):
+        self.count += 1
+        if time.is_dnf():
+            self.dnfs += 1
+        else:
+            bisect.insort(self.sorted, time.time)
+            self.sum += time.time
+
+    # Must be called with the time in the same state as when it was added.
+    def remove(self, time: Time):
+        self.count -= 1
+        if time.is_dnf():
+            self.dnfs -= 1
+        else:
+            del self.sorted[bisect.bisect_left(self.sorted, time.time)]
+            self.sum -= time.time
+
+    def get(self) -> Optional[Time]:
+        value = self.get_value()
+        if value is None:
+            return None
+        return Time('DNF') if value == math.inf else Time(value)
+
+    # Same as get(), but returns the average in seconds, inf for a DNF.
+    def get_value(self) -> Optional[float]:
+        # If there are not enough times recorded, the average is not valid
+        if self.count < self.n:
+            return None
+        # Best and worst results are discarded. If any DNFs remain, the
+        # average is a DNF.
+        if self.dnfs > 1:
+            return math.inf
+        total = self.sum - self.sorted[0]
+        if self.dnfs == 0:
+            total -= self.sorted[-1]
+        return total / (self.n - 2)
+
+
+# Personal bests over the whole history: best single and best average of N
+# for each tracked N, with their progression. Computed in a single pass with
+# one sliding window per N, and then updated as times are added to or removed
+# from the end of the history.
+#
+# Averages that the time history already maintains are shared: it updates
+# them itself, before push() and after pop(). Other averages get their own
+# windows.
+class PersonalBests:
+    def __init__(self, averages: Dict[int, RollingAverage]):
+        self.averages = averages
+        # Windows of tracked averages not in self.averages.
+        self.windows: Dict[int, RollingAverage] = {}
+        # N -> (index of the last solve, result) for every improvement of the
+        # record, in order. N = 1 is the best single.
+        self.progression: Dict[int, List[Tuple[int, Time]]] = {1: []}
+        for n in averages:
+            self.progression[n] = []
+
+    def rebuild(self, data: List[Time], ns=None):
+        ns = list(self.progression) if ns is None else ns
+        windows = {n: RollingAverage(n) for n in ns if n > 1}
+        for n in ns:
+            self.progression[n] = []
+        for i, time in enumerate(data):
+            for n in ns:
+                if n == 1:
+                    self.push_single(i, time)
+                    continue
+                window = windows[n]
+                window.add(time)
+                if i >= n:
+                    window.remove(data[i - n])
+                self.push_average(n, i, window)
+        for n, window in windows.items():
+            if n not in self.averages:
+                self.windows[n] = window
+
+    # Starts tracking the best average of N, computing it over the history.
+    def track(self, n: int, data: List[Time]):
+        self.rebuild(data, [n])
+
+    def push_single(self, i: int, time: Time):
+        progression = self.progression[1]
+        if not time.is_dnf() and (
+                not progression or time < progression[-1][1]):
+            progression.append((i, time))
+
+    def push_average(self, n: int, i: int, window: RollingAverage):
+        progression = self.progression[n]
+        # Only create Time objects for new records.
+        value = window.get_value()
+        if value is None or value == math.inf:
+            return
+        if not progression or value < progression[-1][1].time:
+            progression.append((i, Time(value)))
+
+    # Must be called after the last time was added to the history.
+    def push(self, data: List[Time]):
+        i = len(data) - 1
+        for n in self.progression:
+            if n == 1:
+                self.push_single(i, data[i])
+                continue
+            window = self.averages.get(n)
+            if window is None:
+                window = self.windows[n]
+                window.add(data[i])
+                if i >= n:
+                    window.remove(data[i - n])
+            self.push_average(n, i, window)
+
+    # Must be called before the last time is removed from the history or
+    # edited. After an edit, push() it again.
+    def pop(self, data: List[Time]):
+        i = len(data) - 1
+        for n, progression in self.progression.items():
+            if progression and progression[-1][0] == i:
+                progression.pop()
+            if n in self.windows:
+                window = self.windows[n]
+                window.remove(data[i])
+                if i >= n:
+                    window.add(data[i - n])
+
+    def get(self, n: int) -> Optional[Time]:
+        progression = self.progression[n]
+        return progression[-1][1] if progression else None
 
 
 class TimeHistory(kivy.event.EventDispatcher):
@@ -17,6 +165,16 @@ class TimeHistory(kivy.event.EventDispatcher):
     ao100 = kivy.properties.ObjectProperty(
         None, allownone=True, force_dispatch=True)
 
+    # Personal bests over the whole history.
+    best_single = kivy.properties.ObjectProperty(
+        None, allownone=True, force_dispatch=True)
+    best_ao5 = kivy.properties.ObjectProperty(
+        None, allownone=True, force_dispatch=True)
+    best_ao12 = kivy.properties.ObjectProperty(
+        None, allownone=True, force_dispatch=True)
+    best_ao100 = kivy.properties.ObjectProperty(
+        None, allownone=True, force_dispatch=True)
+
     recent_solves_text = kivy.properties.StringProperty(" ")
     last_time = kivy.properties.ObjectProperty(
         None, allownone=True, force_dispatch=True)
@@ -27,10 +185,43 @@ class TimeHistory(kivy.event.EventDispatcher):
         super().__init__()
         self.data = []
         self.filepath = None
+        self.journal = None
+        self.journal_entries = 0
+        # Set when the times file could not be read completely, and could
+        # not be backed up either. The file is then never rewritten, and
+        # changes are only recorded in the journal.
+        self.keep_file = False
+        # The times file is in the columnar format of historystore, instead
+        # of text.
+        self.binary = False
+        # Optional SQLite backend, used instead of the times file.
+        self.store = None
+        self.averages: Dict[int, RollingAverage] = {}
+        for n in (5, 12, 100):
+            self.track_average(n)
+        self.bests = PersonalBests(self.averages)
+        # Built on first use, as it needs metadata of all solves.
+        self.stage_stats: Optional[StageStats] = None
+
+    # Starts maintaining the average of N for quick access with get_aon.
+    def track_average(self, n: int):
+        average = RollingAverage(n)
+        for time in self.data[-n:]:
+            average.add(time)
+        self.averages[n] = average
 
     def add_time(self, time: Time):
         self.data.append(time)
+        for n, average in self.averages.items():
+            average.add(time)
+            if len(self.data) > n:
+                average.remove(self.data[-n - 1])
+        self.bests.push(self.data)
+        if self.stage_stats:
+            self.stage_stats.push(time)
+        self.record('A', len(self.data) - 1, time)
         self.update_averages()
+        self.update_bests()
         self.update_last_time()
         self.update_recent_times()
 
@@ -42,6 +233,34 @@ class TimeHistory(kivy.event.EventDispatcher):
         self.ao12 = self.get_aon(12)
         self.ao100 = self.get_aon(100)
 
+    def update_bests(self):
+        self.best_single = self.bests.get(1)
+        self.best_ao5 = self.bests.get(5)
+        self.best_ao12 = self.bests.get(12)
+        self.best_ao100 = self.bests.get(100)
+
+    # Best average of N (or best single, for N = 1) over the whole history.
+    # N must be 1, or at least 3.
+    def get_best_aon(self, N) -> Optional[Time]:
+        if N == 2:
+            raise ValueError("Average of 2 is not defined, N must be at "
+                             "least 3")
+        if N not in self.bests.progression:
+            self.bests.track(N, self.data)
+        return self.bests.get(N)
+
+    def get_stage_stats(self) -> StageStats:
+        if self.stage_stats is None:
+            self.stage_stats = StageStats()
+            self.stage_stats.rebuild(self.data)
+        return self.stage_stats
+
+    # List of (solve index, result) for every improvement of the best
+    # average of N.
+    def get_pb_progression(self, N) -> List[Tuple[int, Time]]:
+        self.get_best_aon(N)
+        return self.bests.progression[N]
+
     def update_last_time(self):
         if len(self.data) < 1:
             self.last_time = None
@@ -56,8 +275,15 @@ class TimeHistory(kivy.event.EventDispatcher):
             self.recent_solves_text = (
                 '  '.join(str(t) for t in T))
 
-    # Computes average of N solves using competition rules.
+    # Computes average of N solves using competition rules. N must be at
+    # least 3.
     def get_aon(self, N) -> Optional[Time]:
+        if N < 3:
+            raise ValueError(f"Average of {N} is not defined, N must be at "
+                             "least 3")
+        if N in self.averages:
+            return self.averages[N].get()
+
         # If there are not enough times recorded, the average is not valid
         if len(self.data) < N:
             return None
@@ -78,6 +304,9 @@ class TimeHistory(kivy.event.EventDispatcher):
         if len(self.data) < 1:
             return
         lt = self.data[-1]
+        for average in self.averages.values():
+            average.remove(lt)
+        self.bests.pop(self.data)
         if state == 'DNF':
             lt.set_dnf(not lt.is_dnf())
         elif state == '+2':
@@ -85,7 +314,12 @@ class TimeHistory(kivy.event.EventDispatcher):
         elif state == 'OK':
             lt.set_p2(False)
             lt.set_dnf(False)
+        for average in self.averages.values():
+            average.add(lt)
+        self.bests.push(self.data)
+        self.record('E', len(self.data) - 1, lt)
         self.update_averages()
+        self.update_bests()
         self.update_last_time()
         self.update_recent_times()
 
@@ -97,44 +331,228 @@ class TimeHistory(kivy.event.EventDispatcher):
         else:
             if len(self.data) < 1:
                 return
-            del self.data[-1]
+            for n, average in self.averages.items():
+                average.remove(self.data[-1])
+                if len(self.data) > n:
+                    # The time that left the window returns.
+                    average.add(self.data[-n - 1])
+            self.bests.pop(self.data)
+            if self.stage_stats:
+                self.stage_stats.pop()
+            deleted = self.data.pop()
+            self.record('D', len(self.data), deleted)
             self.update_averages()
+            self.update_bests()
             self.update_last_time()
             self.update_recent_times()
             self.dispatch('on_time_invalidated')
 
+    def load_finished(self):
+        for n in list(self.averages):
+            self.track_average(n)
+        self.bests.rebuild(self.data)
+        self.stage_stats = None
+        self.update_averages()
+        self.update_bests()
+        self.update_last_time()
+        self.update_recent_times()
+
     def use_file(self, filepath):
+        self.load_file(filepath)
+        self.load_finished()
+
+        if self.journal_entries > 0 and not self.keep_file:
+            self.persist()
+        else:
+            self.open_journal('a')
+
+        # Compact the journal every 5 minutes.
+        Clock.schedule_interval(lambda td: self.persist(), 60*5)
+
+    def load_file(self, filepath):
         # Load data from file.
         self.data = []
         self.filepath = filepath
+        self.keep_file = False
         try:
-            with open(filepath, 'r') as f:
-                for line in f:
-                    line = line.strip()
-                    self.data.append(Time(line))
+            if self.binary:
+                self.data = HistoryColumns.load(filepath).to_times()
+            else:
+                with open(filepath, 'r') as f:
+                    for line in f:
+                        line = line.strip()
+                        self.data.append(Time(line))
+        except FileNotFoundError:
+            pass
         except Exception as e:
-            # TODO: Backup the previous file, if it exists. Otherwise we'll
-            # overwrite it with empty data on the next persist().
             print(f"Failed to load times from {filepath}: {str(e)}")
+            # Only some of the times were loaded, and the next persist()
+            # would overwrite the file with them. Keep a copy first.
+            try:
+                shutil.copyfile(filepath, filepath + ".bak")
+                print(f"Saved a backup of the times file to "
+                      f"{filepath}.bak")
+            except Exception as e:
+                print(f"Failed to back up {filepath}, it will not be "
+                      f"rewritten: {str(e)}")
+                self.keep_file = True
 
-        self.update_averages()
-        self.update_last_time()
-        self.update_recent_times()
+        # Apply changes recorded since the file was last written.
+        self.replay_journal()
+
+    # Keeps time history in the columnar binary format of historystore
+    # instead of a text file. If the binary file does not exist yet, times
+    # are imported from the times file at import_path, when given. Changes
+    # are recorded in the journal, like with a text file.
+    def use_binary_file(self, filepath, import_path=None):
+        self.binary = True
+        if (not import_path or os.path.exists(filepath) or
+                not os.path.exists(import_path)):
+            self.use_file(filepath)
+            return
+
+        print(f"Importing times from {import_path} to {filepath}")
+        # The times file is left in place, as a backup.
+        self.binary = False
+        self.load_file(import_path)
+        self.binary = True
+        self.filepath = filepath
+        self.keep_file = False
+        self.persist()
+        self.load_finished()
 
-        # Auto-save every 5 minutes.
+        # Compact the journal every 5 minutes.
         Clock.schedule_interval(lambda td: self.persist(), 60*5)
 
+    # Keeps time history in an SQLite database instead of a times file. If
+    # the database is new, times are imported from import_path, when given.
+    # If the database cannot be opened, the times file at import_path is
+    # used instead.
+    def use_database(self, filepath, import_path=None):
+        from bluetoothcube.sqlitestore import SQLiteStore
+        try:
+            self.store = SQLiteStore(filepath)
+        except Exception as e:
+            print(f"Failed to open time database {filepath}: {str(e)}")
+            if not import_path:
+                raise
+            print(f"Using times file {import_path} instead.")
+            self.store = None
+            self.use_file(import_path)
+            return
+
+        if import_path and self.store.is_empty() and \
+                os.path.exists(import_path):
+            print(f"Importing times from {import_path} to {filepath}")
+            # The times file is left in place, as a backup.
+            self.load_file(import_path)
+            self.store.import_times(self.data)
+            self.filepath = None
+
+        self.data = self.store.load_session()
+        self.load_finished()
+
+        # Changes made within a second are written in one transaction.
+        self.store_trigger = Clock.create_trigger(
+            lambda td: self.store.flush(), 1)
+
+    # The journal records every change to the time history since times file
+    # was last written, one line per change. Each entry stores the index of
+    # the time it applies to, so that replaying it over a file that already
+    # contains the change has no effect.
+    #   A|index|time - a time was added at index
+    #   E|index|time - time at index was edited
+    #   D|index      - time at index was deleted
+    def get_journal_path(self) -> str:
+        return self.filepath + ".journal"
+
+    def open_journal(self, mode):
+        if self.journal:
+            self.journal.close()
+        self.journal_entries = 0
+        try:
+            self.journal = open(self.get_journal_path(), mode)
+        except Exception as e:
+            self.journal = None
+            print(f"Failed to open journal {self.get_journal_path()}: "
+                  f"{str(e)}")
+
+    def record(self, op, index, time: Time):
+        if self.store:
+            self.store.record(op, time)
+            self.store_trigger()
+        if not self.journal:
+            return
+        entry = f"{op}|{index}"
+        if op != 'D':
+            entry += "|" + time.save()
+        try:
+            self.journal.write(entry + "\n")
+            # Make sure the entry survives an app crash.
+            self.journal.flush()
+            self.journal_entries += 1
+        except Exception as e:
+            print(f"Failed to record a change in the journal: {str(e)}")
+
+    def replay_journal(self):
+        self.journal_entries = 0
+        try:
+            with open(self.get_journal_path(), 'r') as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            print(f"Failed to read journal {self.get_journal_path()}: "
+                  f"{str(e)}")
+            return
+
+        for line in lines:
+            try:
+                op, index, *rest = line.strip().split('|', 2)
+                index = int(index)
+                if index > len(self.data):
+                    raise ValueError("Index out of range")
+                if op == 'A':
+                    self.data[index:] = [Time(rest[0])]
+                elif op == 'E':
+                    self.data[index] = Time(rest[0])
+                elif op == 'D':
+                    del self.data[index:]
+                else:
+                    raise ValueError(f"Unknown operation {op}")
+            except Exception as e:
+                # Most likely the app crashed while writing this entry.
+                print(f"Skipping invalid journal entry {line!r}: {str(e)}")
+                continue
+            self.journal_entries += 1
+
+    # Writes the complete times file and clears the journal.
     def persist(self):
-        if not self.filepath:
+        if self.store:
+            self.store.flush()
+            return
+        if not self.filepath or self.keep_file:
             return
+        if self.journal and self.journal_entries == 0:
+            return  # Nothing changed.
 
         print(f"Persisting time history to {self.filepath}")
         try:
-            with open(self.filepath, 'w') as f:
-                for time in self.data:
-                    f.write(time.save() + "\n")
+            # Write to a temporary file first, so that the times file is
+            # always complete.
+            tmp_path = self.filepath + ".tmp"
+            if self.binary:
+                HistoryColumns.from_times(self.data).save(tmp_path)
+            else:
+                with open(tmp_path, 'w') as f:
+                    for time in self.data:
+                        f.write(time.save() + "\n")
+            os.replace(tmp_path, self.filepath)
         except Exception as e:
             print(f"Failed to save times to {self.filepath}: {str(e)}")
+            return
+
+        self.open_journal('w')
 
     def on_time_invalidated(self, *args):
         pass
@@ -15,8 +15,8 @@ class Timer(kivy.event.EventDispatcher):
         self.register_event_type('on_new_time')
         super().__init__()
 
+        # time.perf_counter_ns() of the start of the solve.
         self.start_time = None
-        self.end_time = None
         self.measured_time = 0
 
         self.cube = cube
@@ -40,26 +40,31 @@ class Timer(kivy.event.EventDispatcher):
             return
         self.primed = False
 
-    def start(self):
+    # Solves started or ended by the cube are timed from the arrival of the
+    # state packet (ts, from time.perf_counter_ns()), manual ones from now.
+    def start(self, ts=None):
         if self.running:
             return
         self.unprime()
-        self.start_time = time.time()
+        self.start_time = time.perf_counter_ns() if ts is None else ts
         self.measured_time = 0
         self.running = True
 
         # TODO: This event should probably originate in some other class.
         self.dispatch('on_solve_started')
 
-    def get_time(self) -> float:
+    # Time since the start of the solve, at ts (default: now).
+    def get_time(self, ts=None) -> float:
         if not self.running:
             return self.measured_time
-        return time.time() - self.start_time
+        if ts is None:
+            ts = time.perf_counter_ns()
+        return (ts - self.start_time) / 1e9
 
-    def stop(self):
+    def stop(self, ts=None):
         if not self.running:
             return
-        self.measured_time = time.time() - self.start_time
+        self.measured_time = self.get_time(ts)
         self.running = False
 
         self.dispatch('on_solve_ended')
@@ -73,12 +78,12 @@ class Timer(kivy.event.EventDispatcher):
 
     def on_cube_state_changed(self, cube, newstate):
         if self.primed:
-            self.start()
+            self.start(cube.last_update_ts)
 
     def on_cube_solved_changed(self, cube, solved):
         if solved:
             if self.running:
-                self.stop()
+                self.stop(cube.last_update_ts)
 
     def on_solve_started(self):
         pass
@@ -9,7 +9,8 @@ from kivy.uix.boxlayout import BoxLayout
 from kivy.clock import Clock
 from kivy.uix.scrollview import ScrollView
 
-from bluetoothcube.cubedisplay import CubeDisplay  # noqa: F401
+from bluetoothcube.cubedisplay import (  # noqa: F401
+    CubeDisplay, CubeMeshDisplay)
 
 
 class Hideable(kivy.event.EventDispatcher):
@@ -178,7 +179,7 @@ class CubeStateDisplay(Label):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.cube = App.get_running_app().cube
-        self.cube.bind(on_state_changed=self.on_cube_state_changed)
+        self.cube.bind(on_latest_state=self.on_cube_state_changed)
 
     def on_cube_state_changed(self, cube, new_state):
         self.text = '\n'.join(new_state.get_representation_strings())
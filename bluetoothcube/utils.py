@@ -1,7 +1,10 @@
 import sys
+import struct
 import datetime
 from datetime import timedelta, timezone
 
+from typing import Optional
+
 
 # This implementation is taken from cpython 3.7.
 
@@ -136,3 +139,17 @@ def datetime_from_isoformat(string):
         return datetime.datetime.fromisoformat(string)
     else:
         return fromisoformat(string)
+
+
+EPOCH = datetime.datetime(1970, 1, 1)
+
+# Header of the app's capture and move log files: magic, version, and the
+# wall-clock time the file was started (microseconds since epoch, UTC).
+TIMESTAMPED_HEADER = struct.Struct('<4sB3xq')
+
+
+# Microseconds since epoch of a naive UTC datetime, or of now if not given.
+def epoch_microseconds(dt: Optional[datetime.datetime] = None) -> int:
+    if dt is None:
+        dt = datetime.datetime.utcnow()
+    return (dt - EPOCH) // timedelta(microseconds=1)
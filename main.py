@@ -1,4 +1,47 @@
-from bluetoothcube.main import BluetoothCubeApp
+import argparse
+
+# Solver tables need to be set up before anything imports kociemba.
+from bluetoothcube import kociembatables
+kociembatables.install()
+
+from bluetoothcube.main import BluetoothCubeApp  # noqa: E402
 
 if __name__ == '__main__':
-    BluetoothCubeApp().run()
+    # Kivy consumes its own options, pass these after "--".
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--capture', action='store_true',
+                        help="write packets received from the cube to a "
+                             "capture file")
+    parser.add_argument('--replay', metavar='FILE',
+                        help="replay a capture file instead of connecting "
+                             "to a cube")
+    parser.add_argument('--replay-fast', action='store_true',
+                        help="replay as fast as possible")
+    parser.add_argument('--simulate', metavar='TPS', type=float, default=0,
+                        help="connect to a simulated cube turning at TPS "
+                             "turns per second")
+    parser.add_argument('--simulate-encrypted', action='store_true',
+                        help="make the simulated cube encrypt its packets")
+    parser.add_argument('--latency', action='store_true',
+                        help="measure and show packet handling latency")
+    parser.add_argument('--database', action='store_true',
+                        help="keep time history in an SQLite database, "
+                             "imported from times.txt on first use")
+    parser.add_argument('--binary-history', action='store_true',
+                        help="keep time history in a binary file, "
+                             "imported from times.txt on first use")
+    parser.add_argument('--log-moves', action='store_true',
+                        help="write all moves made on the cube to a move log")
+    args = parser.parse_args()
+
+    app = BluetoothCubeApp()
+    app.capture_packets = args.capture
+    app.replay_path = args.replay
+    app.replay_realtime = not args.replay_fast
+    app.simulate_tps = args.simulate
+    app.simulate_encrypted = args.simulate_encrypted
+    app.show_latency = args.latency
+    app.log_moves = args.log_moves
+    app.use_database = args.database
+    app.binary_history = args.binary_history
+    app.run()
@@ -0,0 +1,50 @@
+import unittest
+
+# Loaded by the app before anything else.
+import kivy.event  # noqa: F401
+import kivy.properties  # noqa: F401
+
+from bluetoothcube.bluetoothcube import BluetoothCube
+from bluetoothcube.cubestate import (
+    CubieCube, encode_giiker_state, kociemba_move_to_giiker)
+
+# Kociemba move numbers.
+R, R_ = 3, 5
+U, U_ = 0, 2
+
+
+class IncrementalTrackingTest(unittest.TestCase):
+    def setUp(self):
+        self.cube = BluetoothCube()
+        self.cube.incremental = True
+        self.real = CubieCube()
+        self.ts = 0
+
+    # Turns the real cube, and returns the packet it would send.
+    def turn(self, move) -> bytes:
+        self.real.apply_move(move)
+        return bytes(encode_giiker_state(
+            self.real.cp, self.real.co, self.real.ep, self.real.eo) +
+            bytes([kociemba_move_to_giiker(move), 0, 0, 0]))
+
+    def receive(self, packet):
+        self.ts += 1000000
+        self.cube.process_state_update(None, packet, self.ts)
+
+    def test_tracks_moves(self):
+        for move in (R, U, U_, R_):
+            self.receive(self.turn(move))
+        self.assertTrue(self.cube.solved)
+
+    def test_solved_after_missed_move(self):
+        self.receive(self.turn(R))
+        self.turn(U)  # Notification lost.
+        self.receive(self.turn(U_))
+        self.assertFalse(self.cube.solved)
+        self.receive(self.turn(R_))
+        self.assertTrue(self.cube.solved)
+        self.assertEqual(self.cube.cube_state, CubieCube())
+
+
+if __name__ == '__main__':
+    unittest.main()
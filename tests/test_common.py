@@ -0,0 +1,34 @@
+import unittest
+
+from bluetoothcube.common import Time, UNKNOWN_TS
+from bluetoothcube.historystore import HistoryColumns
+from bluetoothcube.sqlitestore import SQLiteStore
+
+
+class CorruptTimeTest(unittest.TestCase):
+    def setUp(self):
+        self.data = [
+            Time('2019-01-01T10:00:00|12.00|null'),
+            Time('2019-01-0?T10:00:00|13.00+|null'),
+            Time('|DNF|{"stage_times": [["F2L", 5.0]]}'),
+        ]
+
+    def test_invalid_timestamp(self):
+        self.assertEqual(self.data[1].time, 13.0)
+        self.assertTrue(self.data[1].is_p2())
+        self.assertEqual(self.data[1].ts, UNKNOWN_TS)
+        self.assertEqual(self.data[2].ts, UNKNOWN_TS)
+
+    def test_import_to_database(self):
+        store = SQLiteStore(':memory:')
+        store.import_times(self.data)
+        self.assertEqual([t.ts for t in store.load_session()],
+                         [self.data[0].ts, UNKNOWN_TS, UNKNOWN_TS])
+
+    def test_convert_to_columns(self):
+        columns = HistoryColumns.from_times(self.data)
+        self.assertEqual(columns.get_time(1).ts, UNKNOWN_TS)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import os
+import tempfile
+import unittest
+
+# Loaded by the app before anything else.
+import kivy.event  # noqa: F401
+import kivy.properties  # noqa: F401
+
+from bluetoothcube.common import Time
+from bluetoothcube.historystore import HistoryColumns
+from bluetoothcube.timehistory import TimeHistory
+
+
+class HistoryStoreTest(unittest.TestCase):
+    def roundtrip(self, data):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'times.bin')
+            HistoryColumns.from_times(data).save(path)
+            return HistoryColumns.load(path).to_times()
+
+    def test_roundtrip(self):
+        data = [
+            Time(12.345, {'stage_times': [['Cross', 2.5], ['F2L', 8.125]]}),
+            Time(10.5, {'stage_times': []}),
+            Time(11.0, {'scrambled': True}),
+            Time(9.75),
+            Time('DNF'),
+        ]
+        data[3].p2 = True
+        loaded = self.roundtrip(data)
+        for i in (0, 1, 3, 4):
+            self.assertEqual(loaded[i].save(), data[i].save())
+        # Only stage times are stored, other metadata is dropped.
+        self.assertEqual(loaded[2].meta, {})
+        self.assertIsNone(loaded[3].meta)
+
+    def test_long_stage_name(self):
+        data = [Time(10.0, {'stage_times': [['x' * 17, 1.0]]})]
+        with self.assertRaises(ValueError):
+            HistoryColumns.from_times(data)
+
+    def test_duplicate_stage_name(self):
+        data = [Time(10.0, {'stage_times': [['F2L', 1.0], ['F2L', 2.0]]})]
+        with self.assertRaises(ValueError):
+            HistoryColumns.from_times(data)
+
+
+class BinaryTimeHistoryTest(unittest.TestCase):
+    def test_import_and_reload(self):
+        with tempfile.TemporaryDirectory() as directory:
+            text_path = os.path.join(directory, 'times.txt')
+            binary_path = os.path.join(directory, 'times.bin')
+            data = [Time(12.5, {'stage_times': [['Cross', 2.5]]}),
+                    Time(10.25)]
+            with open(text_path, 'w') as f:
+                for t in data:
+                    f.write(t.save() + "\n")
+
+            th = TimeHistory()
+            th.use_binary_file(binary_path, import_path=text_path)
+            self.assertTrue(os.path.exists(binary_path))
+            th.add_time(Time(11.0))
+            th.mark_last_time('+2')
+            th.journal.close()
+
+            # The new time is only in the journal, and survives a reload.
+            th = TimeHistory()
+            th.use_binary_file(binary_path, import_path=text_path)
+            self.assertEqual([t.save() for t in th.data[:2]],
+                             [t.save() for t in data])
+            self.assertEqual(str(th.data[2]), '13.00+')
+            th.journal.close()
+            self.assertEqual(len(HistoryColumns.load(binary_path)), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()